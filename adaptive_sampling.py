@@ -0,0 +1,90 @@
+import time
+
+from sensor_functions import CO_STATUSES, IAQ_CATEGORIES
+
+
+# Rate of change (units per minute) considered "fast" for each signal, and
+# the distance from a category/status threshold considered "close".
+SIGNALS = {
+    'iaq': {
+        'fast_rate': 10.0,
+        'thresholds': [limit for limit, _ in IAQ_CATEGORIES],
+        'margin': 10.0
+    },
+    'gas_resistance': {
+        'fast_rate': 5000.0,
+        'thresholds': [],
+        'margin': 0.0
+    },
+    'co_ppm': {
+        'fast_rate': 5.0,
+        'thresholds': [limit for limit, _ in CO_STATUSES],
+        'margin': 3.0
+    }
+}
+
+
+def extract_signals(bme_data=None, mq7_data=None):
+    values = {}
+    if bme_data:
+        values['iaq'] = bme_data['iaq']
+        values['gas_resistance'] = bme_data['gas_resistance']
+    if mq7_data:
+        values['co_ppm'] = mq7_data['co_ppm']
+    return values
+
+
+class AdaptiveScheduler:
+    def __init__(self, config):
+        self.min_interval = config['min_interval']
+        self.max_interval = config['max_interval']
+        self.smoothing = config.get('smoothing', 0.5)
+        self.max_growth = config.get('max_growth', 1.5)
+
+        self.interval = config.get('initial_interval', self.min_interval)
+        self.last_values = {}
+        self.last_time = None
+        self.rates = {name: 0.0 for name in SIGNALS}
+        self.activity = 0.0
+
+    def signal_activity(self, name, value):
+        spec = SIGNALS[name]
+        activity = min(1.0, self.rates[name] / spec['fast_rate'])
+
+        for limit in spec['thresholds']:
+            distance = abs(value - limit)
+            if distance < spec['margin']:
+                activity = max(activity, 1.0 - distance / spec['margin'])
+
+        return activity
+
+    def next_interval(self, bme_data=None, mq7_data=None, now=None):
+        if now is None:
+            # Monotonic: a wall-clock step would distort every rate
+            now = time.monotonic()
+
+        values = extract_signals(bme_data, mq7_data)
+        if not values:
+            return self.interval
+
+        elapsed_min = (now - self.last_time) / 60 if self.last_time is not None else 0
+        for name, value in values.items():
+            previous = self.last_values.get(name)
+            if previous is not None and elapsed_min > 0:
+                rate = abs(value - previous) / elapsed_min
+                self.rates[name] += self.smoothing * (rate - self.rates[name])
+
+        self.last_values.update(values)
+        self.last_time = now
+
+        self.activity = max(self.signal_activity(name, value) for name, value in values.items())
+        target = self.max_interval - (self.max_interval - self.min_interval) * self.activity
+
+        # React to activity immediately, but back off gradually once it calms down
+        if target < self.interval:
+            self.interval = target
+        else:
+            self.interval = min(target, self.interval * self.max_growth)
+
+        self.interval = max(self.min_interval, min(self.max_interval, self.interval))
+        return self.interval
@@ -0,0 +1,234 @@
+import json
+import time
+
+from co_calibration import ADS1115_RATES, COCalibration, raw_to_signed
+from sensor_functions import CO_STATUSES
+
+# Register writes/reads around each single-shot conversion
+CONVERSION_OVERHEAD = 0.0015
+
+SENSOR_PRESETS = {
+    'mq7': {
+        'label': 'MQ-7 - Carbon Monoxide (CO)',
+        'curve': {'a': 98.322, 'b': -1.458},
+        'statuses': CO_STATUSES,
+        'alarm_status': 'ALARM'
+    },
+    'mq135': {
+        'label': 'MQ-135 - Air Quality (CO2 equivalent)',
+        'curve': {'a': 110.47, 'b': -2.862},
+        'statuses': [(1000, "Good"), (1500, "Moderate"), (2000, "Poor")],
+        'alarm_status': 'ALARM'
+    },
+    'mq2': {
+        'label': 'MQ-2 - Combustible Gas / Smoke',
+        'curve': {'a': 574.25, 'b': -2.222},
+        'statuses': [(300, "Safe"), (1000, "Elevated"), (2000, "Warning")],
+        'alarm_status': 'ALARM'
+    }
+}
+
+
+def load_channel_config(path, defaults):
+    if not path:
+        # Single MQ-7 channel, as wired by MQ7_CHANNEL/ADS1115_ADDRESS
+        return [{
+            'name': 'co',
+            'sensor': 'mq7',
+            'address': defaults['ads1115_address'],
+            'channel': defaults['mq7_channel'],
+            'R0': defaults['mq7_r0'],
+            'RL': defaults['mq7_rl'],
+            'gain': defaults['ads1115_gain'],
+            'curve': {'a': defaults['mq7_curve_a'], 'b': defaults['mq7_curve_b']}
+        }]
+
+    with open(path) as f:
+        channels = json.load(f)
+
+    for channel in channels:
+        channel.setdefault('sensor', 'mq7')
+        channel.setdefault('address', defaults['ads1115_address'])
+        channel.setdefault('R0', 10000)
+        channel.setdefault('RL', 10000)
+        channel.setdefault('gain', defaults['ads1115_gain'])
+        if channel['sensor'] not in SENSOR_PRESETS:
+            raise ValueError(f"Unknown analog sensor type: {channel['sensor']}")
+        if channel.get('data_rate') is not None and channel['data_rate'] not in ADS1115_RATES:
+            raise ValueError(f"Unsupported ADS1115 data rate for {channel['name']}: {channel['data_rate']}")
+        if isinstance(channel['address'], str):
+            channel['address'] = int(channel['address'], 16)
+
+    return channels
+
+
+def channel_topics(base_topic, channels):
+    topics = {}
+    for channel in channels:
+        name = channel['name']
+        topics[f"{name}_ppm"] = f"{base_topic}/{name}_ppm"
+        topics[f"{name}_voltage"] = f"{base_topic}/{name}_voltage"
+        topics[f"{name}_status"] = f"{base_topic}/{name}_status"
+    return topics
+
+
+def conversion_time(rate):
+    return 1.0 / rate + CONVERSION_OVERHEAD
+
+
+def choose_data_rate(conversions, budget):
+    # Slowest (least noisy) rate at which the whole scan still fits the budget
+    for rate in ADS1115_RATES:
+        if conversions * conversion_time(rate) <= budget:
+            return rate
+    return ADS1115_RATES[-1]
+
+
+def get_status(value, statuses, alarm_status):
+    for limit, status in statuses:
+        if value < limit:
+            return status
+    return alarm_status
+
+
+class AnalogChannel:
+    def __init__(self, config, ads, analog_in, cache_dir=None):
+        preset = SENSOR_PRESETS[config['sensor']]
+
+        self.name = config['name']
+        self.sensor = config['sensor']
+        self.label = config.get('label', preset['label'])
+        self.address = config['address']
+        self.channel = config['channel']
+        self.ads = ads
+        self.analog_in = analog_in
+        self.gain = config['gain']
+        self.data_rate = config.get('data_rate')
+        self.statuses = [tuple(s) for s in config.get('statuses', preset['statuses'])]
+        self.alarm_status = config.get('alarm_status', preset['alarm_status'])
+
+        self.calibration = COCalibration(
+            R0=config['R0'],
+            RL=config['RL'],
+            gain=self.gain,
+            curve=config.get('curve', preset['curve']),
+            cache_dir=cache_dir
+        )
+
+    def read(self):
+        self.ads.gain = self.gain
+        self.ads.data_rate = self.data_rate
+
+        raw_value = self.analog_in.value
+        ppm = self.calibration.lookup(raw_value)
+
+        return {
+            'label': self.label,
+            'ppm': round(ppm, 2),
+            'voltage': round(self.calibration.voltage(raw_value), 3),
+            'raw_value': raw_to_signed(raw_value),
+            'status': get_status(ppm, self.statuses, self.alarm_status)
+        }
+
+
+class ChannelScanner:
+    def __init__(self, channels, ads_factory, analog_in_factory, config=None):
+        config = config or {}
+        self.budget = config.get('scan_budget_ms', 100) / 1000
+        self.channels = []
+        self.devices = {}
+
+        for channel_config in channels:
+            address = channel_config['address']
+            try:
+                if address not in self.devices:
+                    self.devices[address] = ads_factory(address)
+                ads = self.devices[address]
+                analog_in = analog_in_factory(ads, channel_config['channel'])
+            except Exception as e:
+                print(f"⚠ {channel_config['name']} unavailable (ADS1115 @ 0x{address:02X}): {e}")
+                continue
+
+            self.channels.append(AnalogChannel(
+                channel_config, ads, analog_in, cache_dir=config.get('cache_dir')
+            ))
+
+        self.channels = self.interleave(self.channels)
+
+        # Channels with an explicit data_rate take their share of the budget
+        # first; the rest run at one rate chosen to fit what is left.
+        fixed_time = sum(
+            conversion_time(c.data_rate) for c in self.channels if c.data_rate is not None
+        )
+        auto = [c for c in self.channels if c.data_rate is None]
+        if auto:
+            rate = choose_data_rate(len(auto), self.budget - fixed_time)
+            for channel in auto:
+                channel.data_rate = rate
+
+        self.co_channel = next((c for c in self.channels if c.name == 'co'), None)
+
+        self.last_scan_time = 0.0
+        self.max_scan_time = 0.0
+        self.scans = 0
+        self.over_budget = 0
+
+    def interleave(self, channels):
+        # Round-robin across ADS1115 addresses so consecutive conversions hit
+        # different devices
+        by_address = {}
+        for channel in channels:
+            by_address.setdefault(channel.address, []).append(channel)
+
+        ordered = []
+        queues = list(by_address.values())
+        while any(queues):
+            for q in queues:
+                if q:
+                    ordered.append(q.pop(0))
+        return ordered
+
+    def split_readings(self, readings):
+        # The 'co' channel keeps feeding the MQ-7 consumers (co_* topics,
+        # ThingSpeak, history, adaptive sampling) in read_mq7's format.
+        readings = dict(readings)
+        co = readings.pop('co', None) if self.co_channel else None
+        if co is None:
+            return None, readings
+
+        mq7_data = {
+            'co_ppm': co['ppm'],
+            'voltage': co['voltage'],
+            'raw_value': co['raw_value'],
+            'status': co['status']
+        }
+        return mq7_data, readings
+
+    def load_tables(self, enabled=True):
+        if not enabled:
+            return
+        for channel in self.channels:
+            channel.calibration.load()
+
+    def expected_scan_time(self):
+        return sum(conversion_time(c.data_rate) for c in self.channels)
+
+    def fits_budget(self):
+        return self.expected_scan_time() <= self.budget
+
+    def scan(self):
+        started = time.perf_counter()
+        readings = {}
+
+        for channel in self.channels:
+            try:
+                readings[channel.name] = channel.read()
+            except Exception as e:
+                print(f"{channel.label} read error: {e}")
+
+        self.last_scan_time = time.perf_counter() - started
+        self.max_scan_time = max(self.max_scan_time, self.last_scan_time)
+        self.scans += 1
+        if self.last_scan_time > self.budget:
+            self.over_budget += 1
+        return readings
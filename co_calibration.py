@@ -0,0 +1,115 @@
+import hashlib
+import json
+import os
+import random
+from array import array
+
+from sensor_functions import calculate_co_ppm
+
+ADS1115_RATES = (8, 16, 32, 64, 128, 250, 475, 860)
+ADS1115_PGA_RANGE = {2 / 3: 6.144, 1: 4.096, 2: 2.048, 4: 1.024, 8: 0.512, 16: 0.256}
+TABLE_SIZE = 65536
+
+DEFAULT_CURVE = {'a': 98.322, 'b': -1.458}
+
+
+def raw_to_signed(raw_value):
+    raw_value &= 0xFFFF
+    return raw_value - TABLE_SIZE if raw_value >= 0x8000 else raw_value
+
+
+class COCalibration:
+    def __init__(self, R0=10000, RL=10000, gain=1, curve=None, vcc=5.0, cache_dir=None):
+        if gain not in ADS1115_PGA_RANGE:
+            raise ValueError(f"Unsupported ADS1115 gain: {gain}")
+
+        curve = curve or DEFAULT_CURVE
+        self.R0 = R0
+        self.RL = RL
+        self.gain = gain
+        self.curve_a = curve['a']
+        self.curve_b = curve['b']
+        self.vcc = vcc
+        self.full_scale = ADS1115_PGA_RANGE[gain]
+        self.cache_dir = cache_dir
+        self.table = None
+
+    def calibration_hash(self):
+        params = {
+            'R0': self.R0,
+            'RL': self.RL,
+            'full_scale': self.full_scale,
+            'a': self.curve_a,
+            'b': self.curve_b,
+            'vcc': self.vcc
+        }
+        return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()[:16]
+
+    def voltage(self, raw_value):
+        return raw_to_signed(raw_value) * self.full_scale / 32767
+
+    def analytic(self, raw_value):
+        return calculate_co_ppm(
+            self.voltage(raw_value),
+            R0=self.R0,
+            RL=self.RL,
+            curve_a=self.curve_a,
+            curve_b=self.curve_b,
+            vcc=self.vcc
+        )
+
+    def build_table(self):
+        return array('d', (self.analytic(raw) for raw in range(TABLE_SIZE)))
+
+    def cache_path(self):
+        return os.path.join(self.cache_dir, f"co_table_{self.calibration_hash()}.bin")
+
+    def load(self):
+        if self.cache_dir:
+            path = self.cache_path()
+            try:
+                table = array('d')
+                with open(path, 'rb') as f:
+                    table.fromfile(f, TABLE_SIZE)
+                self.table = table
+                if self.validate(samples=256):
+                    return self.table
+                print(f"⚠ CO lookup table {path} does not match calibration, rebuilding")
+            except FileNotFoundError:
+                pass
+            except (OSError, EOFError) as e:
+                print(f"⚠ Cannot read CO lookup table {path}: {e}")
+
+        self.table = self.build_table()
+
+        if self.cache_dir:
+            self.save()
+
+        return self.table
+
+    def save(self):
+        path = self.cache_path()
+        tmp_path = f"{path}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                self.table.tofile(f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠ Cannot cache CO lookup table: {e}")
+
+    def lookup(self, raw_value):
+        if self.table is None:
+            return self.analytic(raw_value)
+        return self.table[raw_value & 0xFFFF]
+
+    def validate(self, samples=None, tolerance=1e-9):
+        if samples is None:
+            indexes = range(TABLE_SIZE)
+        else:
+            indexes = random.sample(range(TABLE_SIZE), samples)
+
+        for raw in indexes:
+            if abs(self.table[raw] - self.analytic(raw)) > tolerance:
+                return False
+        return True
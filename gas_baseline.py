@@ -0,0 +1,126 @@
+import json
+import os
+import time
+
+
+class GasBaseline:
+    def __init__(self, config):
+        self.path = config['path']
+        self.burn_in_samples = config.get('burn_in_samples', 300)
+        self.checkpoint_interval = config.get('checkpoint_interval', 300)
+        self.max_age = config.get('max_age', 7 * 86400)
+        self.sensor_id = config.get('sensor_id', '')
+        self.humidity_weighting = config.get('humidity_weighting', 0.25)
+
+        # Clean air raises gas resistance, so the baseline follows increases
+        # quickly and decreases only slowly.
+        self.alpha_up = config.get('alpha_up', 0.05)
+        self.alpha_down = config.get('alpha_down', 0.001)
+        self.alpha_humidity = config.get('alpha_humidity', 0.01)
+
+        self.gas_baseline = None
+        self.humidity_baseline = None
+        self.samples = 0
+        self.last_checkpoint = time.time()
+
+    def is_calibrated(self):
+        return self.samples >= self.burn_in_samples
+
+    def update(self, gas_resistance, humidity):
+        if gas_resistance <= 0:
+            return
+
+        self.samples += 1
+
+        if self.gas_baseline is None:
+            self.gas_baseline = float(gas_resistance)
+            self.humidity_baseline = float(humidity)
+            return
+
+        if not self.is_calibrated():
+            # Running mean during burn-in
+            alpha = 1.0 / self.samples
+            self.gas_baseline += alpha * (gas_resistance - self.gas_baseline)
+            self.humidity_baseline += alpha * (humidity - self.humidity_baseline)
+            return
+
+        alpha = self.alpha_up if gas_resistance > self.gas_baseline else self.alpha_down
+        self.gas_baseline += alpha * (gas_resistance - self.gas_baseline)
+        self.humidity_baseline += self.alpha_humidity * (humidity - self.humidity_baseline)
+
+    def score(self, gas_resistance, humidity):
+        hum_weight = self.humidity_weighting * 100
+        # A baseline learned in saturated or bone-dry air reaches 0 or 100 %
+        # and would zero the denominators below
+        hum_baseline = min(99.9, max(0.1, self.humidity_baseline))
+        hum_offset = humidity - hum_baseline
+
+        if hum_offset > 0:
+            hum_score = (100 - hum_baseline - hum_offset) / (100 - hum_baseline)
+        else:
+            hum_score = (hum_baseline + hum_offset) / hum_baseline
+        hum_score = max(0, min(1, hum_score)) * hum_weight
+
+        if gas_resistance < self.gas_baseline:
+            gas_score = gas_resistance / self.gas_baseline * (100 - hum_weight)
+        else:
+            gas_score = 100 - hum_weight
+
+        return hum_score + gas_score
+
+    def to_dict(self):
+        return {
+            'sensor_id': self.sensor_id,
+            'gas_baseline': self.gas_baseline,
+            'humidity_baseline': self.humidity_baseline,
+            'samples': self.samples,
+            'saved_at': time.time()
+        }
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            print(f"⚠ Cannot read gas baseline {self.path}: {e}")
+            return False
+
+        if data.get('sensor_id') != self.sensor_id:
+            print(f"⚠ Gas baseline {self.path} belongs to another sensor, ignoring")
+            return False
+
+        if time.time() - data.get('saved_at', 0) > self.max_age:
+            print(f"⚠ Gas baseline {self.path} is older than {self.max_age // 86400} days, ignoring")
+            return False
+
+        if data.get('gas_baseline') is None or data.get('humidity_baseline') is None:
+            return False
+
+        self.gas_baseline = data['gas_baseline']
+        self.humidity_baseline = data['humidity_baseline']
+        self.samples = data.get('samples', 0)
+        return True
+
+    def save(self):
+        if self.gas_baseline is None:
+            return False
+
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(self.to_dict(), f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"⚠ Cannot save gas baseline: {e}")
+            return False
+
+        self.last_checkpoint = time.time()
+        return True
+
+    def maybe_checkpoint(self):
+        if time.time() - self.last_checkpoint >= self.checkpoint_interval:
+            self.save()
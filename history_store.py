@@ -0,0 +1,417 @@
+import bisect
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+BME680_FIELDS = {
+    'temperature': 'temperature',
+    'humidity': 'humidity',
+    'pressure': 'pressure',
+    'gas_resistance': 'gas_resistance',
+    'iaq': 'iaq'
+}
+
+MQ7_FIELDS = {
+    'co_ppm': 'co_ppm',
+    'voltage': 'co_voltage',
+    'raw_value': 'co_raw_value'
+}
+
+HISTORY_FIELDS = list(BME680_FIELDS.values()) + list(MQ7_FIELDS.values())
+
+
+def flatten_reading(bme_data=None, mq7_data=None):
+    values = {}
+
+    if bme_data:
+        for key, field in BME680_FIELDS.items():
+            if bme_data.get(key) is not None:
+                values[field] = float(bme_data[key])
+
+    if mq7_data:
+        for key, field in MQ7_FIELDS.items():
+            if mq7_data.get(key) is not None:
+                values[field] = float(mq7_data[key])
+
+    return values
+
+
+class RawTier:
+    def __init__(self, retention):
+        self.resolution = 0
+        self.retention = retention
+        self.timestamps = deque()
+        self.rows = deque()
+        self.version = 0
+
+    def add(self, timestamp, values):
+        self.timestamps.append(timestamp)
+        self.rows.append(values)
+        self.version += 1
+        self.expire(timestamp)
+
+    def expire(self, now):
+        cutoff = now - self.retention
+        expired = False
+        while self.timestamps and self.timestamps[0] < cutoff:
+            self.timestamps.popleft()
+            self.rows.popleft()
+            expired = True
+        if expired:
+            self.version += 1
+
+    def oldest(self):
+        return self.timestamps[0] if self.timestamps else None
+
+    def cache_version(self, start, end):
+        return self.version
+
+    def query(self, field, start, end):
+        lo = bisect.bisect_left(self.timestamps, start)
+        hi = bisect.bisect_left(self.timestamps, end)
+
+        points = []
+        for i in range(lo, hi):
+            value = self.rows[i].get(field)
+            if value is not None:
+                points.append((self.timestamps[i], 1, value, value, value))
+        return points
+
+
+class RollupTier:
+    def __init__(self, resolution, retention):
+        self.resolution = resolution
+        self.retention = retention
+        self.timestamps = deque()
+        self.buckets = deque()
+        self.open_start = None
+        self.open_bucket = {}
+        self.open_updates = 0
+        self.version = 0
+
+    def add(self, timestamp, values):
+        bucket_start = timestamp - (timestamp % self.resolution)
+
+        if self.open_start is not None and bucket_start != self.open_start:
+            self.close()
+
+        if self.open_start is None:
+            self.open_start = bucket_start
+
+        for field, value in values.items():
+            agg = self.open_bucket.get(field)
+            if agg is None:
+                self.open_bucket[field] = [1, value, value, value]
+            else:
+                agg[0] += 1
+                agg[1] += value
+                agg[2] = min(agg[2], value)
+                agg[3] = max(agg[3], value)
+        self.open_updates += 1
+
+        self.expire(timestamp)
+
+    def close(self):
+        if self.open_start is None:
+            return
+
+        if self.open_bucket:
+            self.timestamps.append(self.open_start)
+            self.buckets.append(self.open_bucket)
+            self.version += 1
+
+        self.open_start = None
+        self.open_bucket = {}
+        self.open_updates = 0
+
+    def expire(self, now):
+        cutoff = now - self.retention
+        expired = False
+        while self.timestamps and self.timestamps[0] < cutoff:
+            self.timestamps.popleft()
+            self.buckets.popleft()
+            expired = True
+        if expired:
+            self.version += 1
+
+    def oldest(self):
+        if self.timestamps:
+            return self.timestamps[0]
+        return self.open_start
+
+    def covers_open(self, start, end):
+        return self.open_start is not None and start <= self.open_start < end
+
+    def cache_version(self, start, end):
+        # Ranges reaching into the open bucket change with every reading;
+        # older ranges stay cached until a bucket closes or expires.
+        if self.covers_open(start, end):
+            return (self.version, self.open_updates)
+        return self.version
+
+    def closed_since(self, after):
+        # Closed buckets are never modified again, so they can be appended
+        # to the checkpoint once and forgotten.
+        if after is None:
+            return list(zip(self.timestamps, self.buckets))
+        lo = bisect.bisect_right(self.timestamps, after)
+        return [(self.timestamps[i], self.buckets[i]) for i in range(lo, len(self.timestamps))]
+
+    def restore(self, timestamp, bucket):
+        if self.timestamps and timestamp <= self.timestamps[-1]:
+            return False
+        self.timestamps.append(timestamp)
+        self.buckets.append(bucket)
+        self.version += 1
+        return True
+
+    def query(self, field, start, end):
+        lo = bisect.bisect_left(self.timestamps, start)
+        hi = bisect.bisect_left(self.timestamps, end)
+
+        points = []
+        for i in range(lo, hi):
+            agg = self.buckets[i].get(field)
+            if agg is not None:
+                count, total, low, high = agg
+                points.append((self.timestamps[i], count, total, low, high))
+
+        # The open bucket holds everything since the last boundary, so the
+        # tail of the range is not missing up to one resolution step.
+        if self.covers_open(start, end):
+            agg = self.open_bucket.get(field)
+            if agg is not None:
+                count, total, low, high = agg
+                points.append((self.open_start, count, total, low, high))
+        return points
+
+
+class HistoryStore:
+    def __init__(self, config=None):
+        config = config or {}
+
+        self.raw = RawTier(config.get('raw_retention', 3600))
+        self.minute = RollupTier(60, config.get('minute_retention', 2 * 86400))
+        self.hour = RollupTier(3600, config.get('hour_retention', 90 * 86400))
+        self.tiers = [self.raw, self.minute, self.hour]
+
+        self.cache = OrderedDict()
+        self.cache_size = config.get('cache_size', 128)
+        self.lock = threading.Lock()
+
+        # Closed rollup buckets are appended to a JSON-lines checkpoint; raw
+        # points and the open buckets are volatile.
+        self.path = config.get('path')
+        self.checkpoint_interval = config.get('checkpoint_interval', 300)
+        self.last_checkpoint = time.time()
+        self.rollups = {'minute': self.minute, 'hour': self.hour}
+        self.saved_until = {name: None for name in self.rollups}
+        self.saved_lines = 0
+        self.compact_next = False
+
+        self.stats = {
+            'readings': 0,
+            'queries': 0,
+            'cache_hits': 0,
+            'cache_misses': 0
+        }
+
+    def add_reading(self, bme_data=None, mq7_data=None, timestamp=None):
+        values = flatten_reading(bme_data, mq7_data)
+        if not values:
+            return
+
+        if timestamp is None:
+            timestamp = time.time()
+
+        with self.lock:
+            for tier in self.tiers:
+                tier.add(timestamp, values)
+            self.stats['readings'] += 1
+
+    def select_tier(self, start, resolution):
+        eligible = [tier for tier in self.tiers if tier.resolution <= resolution]
+
+        for tier in reversed(eligible):
+            oldest = tier.oldest()
+            if oldest is not None and oldest <= start:
+                return tier
+
+        # Range reaches past the retention of the fine tiers
+        for tier in self.tiers[len(eligible):]:
+            oldest = tier.oldest()
+            if oldest is not None and oldest <= start:
+                return tier
+
+        # History is shorter than the requested range
+        with_data = [tier for tier in reversed(eligible) if tier.oldest() is not None]
+        if not with_data:
+            return self.raw
+        return min(with_data, key=lambda tier: tier.oldest())
+
+    def query(self, field, start, end, resolution=60):
+        if field not in HISTORY_FIELDS:
+            raise ValueError(f"Unknown field: {field}")
+        if end <= start:
+            raise ValueError("Query end must be after start")
+
+        resolution = max(1, int(resolution))
+        start = start - (start % resolution)
+        end = end - (end % resolution) + resolution
+
+        with self.lock:
+            self.stats['queries'] += 1
+
+            tier = self.select_tier(start, resolution)
+            key = (field, start, end, resolution, id(tier), tier.cache_version(start, end))
+
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.cache.move_to_end(key)
+                self.stats['cache_hits'] += 1
+                return cached
+
+            self.stats['cache_misses'] += 1
+            points = tier.query(field, start, end)
+
+        result = {
+            'field': field,
+            'start': start,
+            'end': end,
+            'resolution': resolution,
+            'tier': tier.resolution,
+            'points': self.rebucket(points, resolution)
+        }
+
+        with self.lock:
+            self.cache[key] = result
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+        return result
+
+    def rebucket(self, points, resolution):
+        buckets = OrderedDict()
+
+        for timestamp, count, total, low, high in points:
+            bucket_start = timestamp - (timestamp % resolution)
+            agg = buckets.get(bucket_start)
+            if agg is None:
+                buckets[bucket_start] = [count, total, low, high]
+            else:
+                agg[0] += count
+                agg[1] += total
+                agg[2] = min(agg[2], low)
+                agg[3] = max(agg[3], high)
+
+        return [
+            {
+                't': bucket_start,
+                'avg': round(total / count, 3),
+                'min': low,
+                'max': high,
+                'count': count
+            }
+            for bucket_start, (count, total, low, high) in buckets.items()
+        ]
+
+    def load(self):
+        if not self.path:
+            return False
+
+        lines = 0
+        torn = 0
+        try:
+            with open(self.path) as f, self.lock:
+                for line in f:
+                    lines += 1
+                    try:
+                        entry = json.loads(line)
+                        tier = self.rollups[entry['tier']]
+                        tier.restore(entry['t'], entry['b'])
+                    except (ValueError, KeyError, TypeError):
+                        # A torn last line from an interrupted append
+                        torn += 1
+                        continue
+
+                now = time.time()
+                for name, tier in self.rollups.items():
+                    tier.expire(now)
+                    self.saved_until[name] = tier.timestamps[-1] if tier.timestamps else None
+                self.saved_lines = lines
+                # Appending after a torn line would corrupt the next entry
+                self.compact_next = torn > 0
+                self.cache.clear()
+        except FileNotFoundError:
+            return False
+        except OSError as e:
+            print(f"⚠ Cannot read history checkpoint {self.path}: {e}")
+            return False
+
+        return True
+
+    def checkpoint_entries(self, full):
+        entries = []
+        saved_until = {}
+        for name, tier in self.rollups.items():
+            after = None if full else self.saved_until[name]
+            for timestamp, bucket in tier.closed_since(after):
+                entries.append(json.dumps({'tier': name, 't': timestamp, 'b': bucket}))
+            saved_until[name] = tier.timestamps[-1] if tier.timestamps else self.saved_until[name]
+        return entries, saved_until
+
+    def save(self):
+        if not self.path:
+            return False
+
+        with self.lock:
+            live = len(self.minute.timestamps) + len(self.hour.timestamps)
+            # Rewrite once expired buckets make up most of the file,
+            # otherwise only append what closed since the last checkpoint.
+            compact = self.compact_next or self.saved_lines > 2 * live + 100
+            entries, saved_until = self.checkpoint_entries(full=compact)
+
+        if not entries and not compact:
+            self.last_checkpoint = time.time()
+            return True
+
+        data = "".join(f"{entry}\n" for entry in entries)
+        try:
+            if compact:
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, 'w') as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+                self.saved_lines = len(entries)
+            else:
+                with open(self.path, 'a') as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                self.saved_lines += len(entries)
+        except OSError as e:
+            print(f"⚠ Cannot save history checkpoint: {e}")
+            return False
+
+        self.saved_until = saved_until
+        self.compact_next = False
+        self.last_checkpoint = time.time()
+        return True
+
+    def maybe_checkpoint(self):
+        if time.time() - self.last_checkpoint >= self.checkpoint_interval:
+            self.save()
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['raw_points'] = len(self.raw.timestamps)
+            stats['minute_buckets'] = len(self.minute.timestamps)
+            stats['hour_buckets'] = len(self.hour.timestamps)
+            stats['cached_responses'] = len(self.cache)
+        return stats
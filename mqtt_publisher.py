@@ -1,8 +1,22 @@
 import time
 import json
+import queue
+import random
 import ssl
+import threading
+import traceback
 from datetime import datetime
 import paho.mqtt.client as mqtt
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
+
+# Alias priority: per-reading topics first, occasional ones last
+ALIAS_ORDER = [
+    'temperature', 'humidity', 'pressure', 'gas_resistance',
+    'air_quality_iaq', 'air_quality_category',
+    'co_ppm', 'co_voltage', 'co_status',
+    'measurement_interval', 'status', 'availability'
+]
 
 
 class AirQualityMQTTPublisher:
@@ -15,37 +29,131 @@ class AirQualityMQTTPublisher:
         self.client_id = config['client_id']
         self.topics = config['topics']
         self.connected = False
+        self.config = config
 
-        self.client = mqtt.Client(
-            client_id=self.client_id,
-            clean_session=True,
-            protocol=mqtt.MQTTv311
-        )
+        self.use_v5 = config.get('use_v5', False)
+        self.message_expiry = config.get('message_expiry', 300)
+        self.topic_aliases = {}
+        self.aliases_sent = set()
+
+        # paho's client is only driven from the supervisor thread; other
+        # threads hand messages over through the outbox.
+        self.outbox = queue.Queue(maxsize=config.get('outbox_size', 1000))
+        self.last_message = None
+
+        self.reconnect_min_delay = config.get('reconnect_min_delay', 1.0)
+        self.reconnect_max_delay = config.get('reconnect_max_delay', 120.0)
+        self.reconnect_jitter = config.get('reconnect_jitter', 0.5)
+        self.reconnect_stable_time = config.get('reconnect_stable_time', 30.0)
+
+        self.state = 'disconnected'
+        self.state_listeners = []
+        self.stop_event = threading.Event()
+        self.supervisor_thread = None
+        self.disconnected_at = time.time()
+        self.connected_at = None
+
+        self.stats = {
+            'connect_attempts': 0,
+            'reconnects': 0,
+            'disconnects': 0,
+            'total_downtime': 0.0,
+            'last_time_to_reconnect': None,
+            'outbox_dropped': 0,
+            'outbox_expired': 0,
+            'messages': 0,
+            'bytes_sent': 0,
+            'bytes_baseline': 0
+        }
+
+        self.client = self.create_client()
+
+    def create_client(self):
+        if self.use_v5:
+            client = mqtt.Client(client_id=self.client_id, protocol=mqtt.MQTTv5)
+        else:
+            client = mqtt.Client(
+                client_id=self.client_id,
+                clean_session=True,
+                protocol=mqtt.MQTTv311
+            )
 
-        self.client.on_connect = self.on_connect
-        self.client.on_disconnect = self.on_disconnect
-        self.client.on_publish = self.on_publish
+        client.on_connect = self.on_connect
+        client.on_disconnect = self.on_disconnect
+        client.on_publish = self.on_publish
  
-        self.client.username_pw_set(username=self.username, password=self.password)
+        client.username_pw_set(username=self.username, password=self.password)
 
         if self.use_tls:
-            self.client.tls_set(
-                ca_certs=config.get('ca_cert', "/etc/mosquitto/certs/ca.crt"),
+            client.tls_set(
+                ca_certs=self.config.get('ca_cert', "/etc/mosquitto/certs/ca.crt"),
                 cert_reqs=ssl.CERT_REQUIRED,
                 tls_version=ssl.PROTOCOL_TLSv1_2
             )
 
-        self.client.will_set(
+        client.will_set(
             self.topics['availability'],
             payload="offline",
             qos=1,
             retain=True
         )
+
+        return client
     
-    def on_connect(self, client, userdata, flags, rc):
+    def add_state_listener(self, callback):
+        self.state_listeners.append(callback)
+
+    def set_state(self, state):
+        if state == self.state:
+            return
+        self.state = state
+        for callback in self.state_listeners:
+            try:
+                callback(state, self.get_stats())
+            except Exception as e:
+                print(f"⚠ MQTT state listener error: {e}")
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['state'] = self.state
+        stats['outbox_depth'] = self.outbox.qsize()
+        stats['current_downtime'] = (
+            time.time() - self.disconnected_at if self.disconnected_at else 0.0
+        )
+        return stats
+
+    def assign_topic_aliases(self, properties):
+        # Aliases only live for one connection and are capped by the broker
+        alias_maximum = getattr(properties, 'TopicAliasMaximum', 0) if properties else 0
+
+        self.topic_aliases = {}
+        self.aliases_sent = set()
+        names = [n for n in ALIAS_ORDER if n in self.topics]
+        names += [n for n in self.topics if n not in ALIAS_ORDER]
+        for name in names[:alias_maximum]:
+            self.topic_aliases[self.topics[name]] = len(self.topic_aliases) + 1
+
+        if self.topic_aliases:
+            print(f"✓ MQTT v5 topic aliases: {len(self.topic_aliases)} (broker max {alias_maximum})")
+
+    def on_connect(self, client, userdata, flags, rc, properties=None):
         if rc == 0:
             print(f"✓ Connected to MQTT: {self.broker_host}:{self.broker_port}")
+            if self.use_v5:
+                self.assign_topic_aliases(properties)
             self.connected = True
+            self.connected_at = time.time()
+
+            if self.disconnected_at is not None:
+                downtime = time.time() - self.disconnected_at
+                if self.stats['disconnects'] > 0:
+                    self.stats['reconnects'] += 1
+                    self.stats['total_downtime'] += downtime
+                    self.stats['last_time_to_reconnect'] = downtime
+                    print(f"✓ MQTT reconnected after {downtime:.1f}s")
+                self.disconnected_at = None
+
+            self.set_state('connected')
             self.client.publish(
                 self.topics['availability'],
                 payload="online",
@@ -56,48 +164,122 @@ class AirQualityMQTTPublisher:
             print(f"✗ MQTT connection error. Code: {rc}")
             self.connected = False
     
-    def on_disconnect(self, client, userdata, rc):
+    def on_disconnect(self, client, userdata, rc, properties=None):
+        if self.disconnected_at is None:
+            self.disconnected_at = time.time()
+            self.stats['disconnects'] += 1
         self.connected = False
         if rc != 0:
             print(f"⚠ Unexpected MQTT disconnection. Code: {rc}")
+        self.set_state('disconnected')
     
     def on_publish(self, client, userdata, mid):
         pass
     
-    def connect(self, retry_attempts=5, retry_delay=5):
-        for attempt in range(retry_attempts):
+    def backoff_delay(self, failures):
+        # Capped exponent: after ~1000 failures 2 ** failures no longer fits
+        # a float and the multiplication would raise OverflowError.
+        delay = min(self.reconnect_max_delay, self.reconnect_min_delay * (2 ** min(failures, 32)))
+        return delay * (1 - self.reconnect_jitter * random.random())
+
+    def supervise(self):
+        # Owns the network loop and every call into the client, so reconnects
+        # follow our backoff instead of paho's fixed reconnect_delay and
+        # publishes never write to the socket from the caller's thread.
+        failures = 0
+        while not self.stop_event.is_set():
             try:
-                print(f"Connecting to MQTT ({attempt + 1}/{retry_attempts})...")
-                self.client.connect(self.broker_host, self.broker_port, keepalive=60)
-                self.client.loop_start()
- 
-                timeout = 10
-                start_time = time.time()
-                while not self.connected and (time.time() - start_time) < timeout:
-                    time.sleep(0.1)
-                
-                if self.connected:
-                    return True
-                    
+                failures = self.connect_cycle(failures)
             except Exception as e:
-                print(f"✗ MQTT connection error: {e}")
-            
-            if attempt < retry_attempts - 1:
-                print(f"Retrying in {retry_delay}s...")
-                time.sleep(retry_delay)
-        
-        return False
+                # Nothing may end reconnection: without this thread the
+                # publisher would stay offline for good.
+                print(f"✗ MQTT supervisor error: {e}")
+                traceback.print_exc()
+                failures += 1
+                self.stop_event.wait(self.reconnect_max_delay)
+
+    def connect_cycle(self, failures):
+        # One connection attempt, its network loop and the backoff wait;
+        # returns the updated failure count.
+        self.set_state('connecting')
+        self.stats['connect_attempts'] += 1
+
+        try:
+            if self.use_v5:
+                # A fresh client drops in-flight messages of the previous
+                # connection: they may reference topic aliases the new
+                # connection does not know, and would be stale anyway.
+                if self.stats['connect_attempts'] > 1:
+                    self.client = self.create_client()
+                self.client.connect(
+                    self.broker_host,
+                    self.broker_port,
+                    keepalive=60,
+                    clean_start=True
+                )
+            else:
+                self.client.connect(self.broker_host, self.broker_port, keepalive=60)
+            rc = mqtt.MQTT_ERR_SUCCESS
+            while rc == mqtt.MQTT_ERR_SUCCESS and not self.stop_event.is_set():
+                self.drain_outbox()
+                rc = self.client.loop(timeout=0.1)
+                # A connection that drops right after CONNACK keeps
+                # backing off; only a stable one resets the delay.
+                if (self.connected and
+                        time.time() - self.connected_at >= self.reconnect_stable_time):
+                    failures = 0
+        except Exception as e:
+            print(f"✗ MQTT connection error: {e}")
+
+        if self.stop_event.is_set():
+            self.shutdown()
+            return failures
+
+        if self.connected or self.disconnected_at is None:
+            self.on_disconnect(self.client, None, mqtt.MQTT_ERR_CONN_LOST)
+
+        delay = self.backoff_delay(failures)
+        print(f"Reconnecting to MQTT in {delay:.1f}s (attempt {self.stats['connect_attempts'] + 1})...")
+        self.stop_event.wait(delay)
+        return failures + 1
+
+    def shutdown(self, timeout=3):
+        if not self.connected:
+            return
+        try:
+            self.drain_outbox()
+            # paho keeps QoS 1 messages beyond max_inflight queued; let them
+            # go out before the DISCONNECT.
+            deadline = time.monotonic() + timeout
+            while (self.connected and self.last_message is not None
+                   and not self.last_message.is_published()
+                   and time.monotonic() < deadline):
+                self.client.loop(timeout=0.1)
+            self.client.disconnect()
+            self.client.loop(timeout=0.5)
+        except Exception as e:
+            print(f"⚠ MQTT shutdown error: {e}")
+
+    def connect(self, timeout=10):
+        if self.supervisor_thread is None:
+            print(f"Connecting to MQTT ({self.broker_host}:{self.broker_port})...")
+            self.stop_event.clear()
+            self.supervisor_thread = threading.Thread(target=self.supervise, daemon=True)
+            self.supervisor_thread.start()
+
+        start_time = time.time()
+        while not self.connected and (time.time() - start_time) < timeout:
+            time.sleep(0.1)
+
+        return self.connected
     
     def disconnect(self):
         if self.connected:
-            self.client.publish(
-                self.topics['availability'],
-                payload="offline",
-                qos=1,
-                retain=True
-            )
-        self.client.loop_stop()
-        self.client.disconnect()
+            self.enqueue(self.topics['availability'], "offline", qos=1, retain=True)
+        self.stop_event.set()
+        if self.supervisor_thread:
+            self.supervisor_thread.join(timeout=5)
+            self.supervisor_thread = None
     
     def publish(self, topic, value, unit="", status="", qos=1, retain=True):
         if not self.connected:
@@ -111,38 +293,123 @@ class AirQualityMQTTPublisher:
             'timestamp': timestamp
         }
         
-        if unit:
-            payload['unit'] = unit
         if status:
             payload['status'] = status
-        
+
+        return self.enqueue(topic, payload, unit=unit, qos=qos, retain=retain)
+
+    def enqueue(self, topic, payload, unit="", qos=1, retain=False):
         try:
-            result = self.client.publish(
-                topic,
-                json.dumps(payload),
-                qos=qos,
-                retain=retain
-            )
-            
-            if result.rc != mqtt.MQTT_ERR_SUCCESS:
-                print(f"⚠ Publish error to {topic}: {result.rc}")
-                return False
-            
-            return True
-            
-        except Exception as e:
-            print(f"✗ Exception during publish: {e}")
+            self.outbox.put_nowait((topic, payload, unit, qos, retain, time.monotonic()))
+        except queue.Full:
+            self.stats['outbox_dropped'] += 1
+            print(f"⚠ MQTT outbox full. Dropping message to {topic}")
+            return False
+        return True
+
+    def drain_outbox(self):
+        while self.connected:
+            try:
+                message = self.outbox.get_nowait()
+            except queue.Empty:
+                return
+
+            try:
+                self.send(*message)
+            except Exception as e:
+                print(f"✗ Exception during publish: {e}")
+
+    def send(self, topic, payload, unit, qos, retain, queued_at):
+        if isinstance(payload, str):
+            # Plain control messages (availability) go out without v5
+            # properties: a retained "offline" must not expire.
+            result = self.client.publish(topic, payload, qos=qos, retain=retain)
+            self.last_message = result
+            return result.rc == mqtt.MQTT_ERR_SUCCESS
+
+        # A reading that waited out an outage in the outbox is as stale as
+        # one the broker would have expired
+        age = time.monotonic() - queued_at
+        if age >= self.message_expiry:
+            self.stats['outbox_expired'] += 1
+            return False
+
+        baseline_payload = json.dumps(dict(payload, unit=unit) if unit else payload)
+        message = json.dumps(payload) if self.use_v5 else baseline_payload
+        baseline_bytes = 2 + len(topic.encode()) + len(baseline_payload.encode())
+
+        if self.use_v5:
+            send_topic, properties = self.v5_publish_properties(topic, unit, age)
+            sent_bytes = (2 + len(send_topic.encode()) + len(properties.pack())
+                          + len(message.encode()))
+        else:
+            send_topic, properties = topic, None
+            sent_bytes = baseline_bytes
+
+        result = self.client.publish(
+            send_topic,
+            message,
+            qos=qos,
+            retain=retain,
+            properties=properties
+        )
+
+        if result.rc != mqtt.MQTT_ERR_SUCCESS:
+            print(f"⚠ Publish error to {topic}: {result.rc}")
             return False
+
+        self.last_message = result
+        if send_topic:
+            self.aliases_sent.add(topic)
+
+        self.stats['messages'] += 1
+        self.stats['bytes_sent'] += sent_bytes
+        self.stats['bytes_baseline'] += baseline_bytes
+        return True
     
+    def v5_publish_properties(self, topic, unit, age):
+        properties = Properties(PacketTypes.PUBLISH)
+        # The expiry counts from when the reading was queued, not sent
+        properties.MessageExpiryInterval = max(1, round(self.message_expiry - age))
+        if unit:
+            properties.UserProperty = ('unit', unit)
+
+        send_topic = topic
+        alias = self.topic_aliases.get(topic)
+        if alias:
+            properties.TopicAlias = alias
+            # The first publish on a connection binds the alias to the topic;
+            # later ones may leave the topic name empty.
+            if topic in self.aliases_sent:
+                send_topic = ""
+
+        return send_topic, properties
+
+    def get_byte_savings(self):
+        messages = self.stats['messages']
+        if not messages:
+            return None
+
+        saved = self.stats['bytes_baseline'] - self.stats['bytes_sent']
+        return {
+            'messages': messages,
+            'bytes_per_message': saved / messages,
+            'percent': saved / self.stats['bytes_baseline'] * 100
+        }
+
     def publish_status(self, message):
         if self.connected:
-            payload = json.dumps({
+            payload = {
                 'message': message,
                 'timestamp': datetime.now().isoformat()
-            })
-            self.client.publish(self.topics['status'], payload, qos=1, retain=False)
+            }
+            self.enqueue(self.topics['status'], payload, qos=1, retain=False)
     
-    def publish_sensor_data(self, bme_data=None, mq7_data=None):
+    def publish_measurement_interval(self, interval):
+        if self.connected and 'measurement_interval' in self.topics:
+            self.publish(self.topics['measurement_interval'], round(interval, 1), unit="s")
+
+    def publish_sensor_data(self, bme_data=None, mq7_data=None, gas_data=None):
         if not self.connected:
             return
 
@@ -158,3 +425,8 @@ class AirQualityMQTTPublisher:
             self.publish(self.topics['co_ppm'], mq7_data['co_ppm'], unit="ppm", status=mq7_data['status'])
             self.publish(self.topics['co_voltage'], mq7_data['voltage'], unit="V")
             self.publish(self.topics['co_status'], mq7_data['status'], unit="")
+
+        for name, data in (gas_data or {}).items():
+            self.publish(self.topics[f"{name}_ppm"], data['ppm'], unit="ppm", status=data['status'])
+            self.publish(self.topics[f"{name}_voltage"], data['voltage'], unit="V")
+            self.publish(self.topics[f"{name}_status"], data['status'], unit="")
@@ -0,0 +1,263 @@
+import json
+import queue
+import threading
+import time
+from datetime import datetime
+
+from sensor_functions import print_measurement
+
+
+class Reading:
+    def __init__(self, bme_data, mq7_data, measurement_count, interval, timestamp=None,
+                 gas_data=None, scan_time=None, scan_budget=None):
+        self.bme_data = bme_data
+        self.mq7_data = mq7_data
+        self.gas_data = gas_data or {}
+        self.scan_time = scan_time
+        self.scan_budget = scan_budget
+        self.measurement_count = measurement_count
+        self.interval = interval
+        self.timestamp = timestamp if timestamp is not None else time.time()
+
+    def to_dict(self):
+        return {
+            'measurement': self.measurement_count,
+            'timestamp': datetime.fromtimestamp(self.timestamp).isoformat(),
+            'interval': self.interval,
+            'bme680': self.bme_data,
+            'mq7': self.mq7_data,
+            'gas': self.gas_data,
+            'scan_time_ms': round(self.scan_time * 1000, 2) if self.scan_time is not None else None
+        }
+
+
+class OutputSink:
+    name = 'sink'
+
+    def __init__(self, queue_size=100, policy='drop_oldest', block_timeout=5.0):
+        if policy not in ('drop_oldest', 'drop_newest', 'block'):
+            raise ValueError(f"Unknown sink policy: {policy}")
+
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.stop_event = threading.Event()
+        self.thread = None
+
+        self.stats = {
+            'emitted': 0,
+            'written': 0,
+            'dropped': 0,
+            'errors': 0,
+            'queue_depth_max': 0,
+            'last_lag': 0.0,
+            'max_lag': 0.0,
+            'total_write_time': 0.0
+        }
+
+    def write(self, reading):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def start(self):
+        self.thread = threading.Thread(target=self.worker, name=f"sink-{self.name}", daemon=True)
+        self.thread.start()
+
+    def emit(self, reading):
+        self.stats['emitted'] += 1
+
+        if self.policy == 'block':
+            try:
+                self.queue.put(reading, timeout=self.block_timeout)
+            except queue.Full:
+                self.stats['dropped'] += 1
+        else:
+            try:
+                self.queue.put_nowait(reading)
+            except queue.Full:
+                self.stats['dropped'] += 1
+                if self.policy == 'drop_oldest':
+                    try:
+                        self.queue.get_nowait()
+                        self.queue.put_nowait(reading)
+                    except (queue.Empty, queue.Full):
+                        pass
+
+        depth = self.queue.qsize()
+        if depth > self.stats['queue_depth_max']:
+            self.stats['queue_depth_max'] = depth
+
+    def worker(self):
+        while not self.stop_event.is_set() or not self.queue.empty():
+            try:
+                reading = self.queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+            started = time.time()
+            try:
+                self.write(reading)
+                self.stats['written'] += 1
+            except Exception as e:
+                print(f"✗ Output sink '{self.name}' error: {e}")
+                self.stats['errors'] += 1
+
+            finished = time.time()
+            lag = finished - reading.timestamp
+            self.stats['last_lag'] = lag
+            self.stats['max_lag'] = max(self.stats['max_lag'], lag)
+            self.stats['total_write_time'] += finished - started
+
+    def stop(self, timeout=10):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=timeout)
+        self.close()
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['queue_depth'] = self.queue.qsize()
+        stats['policy'] = self.policy
+        written = stats['written']
+        stats['avg_write_time'] = stats['total_write_time'] / written if written else 0.0
+        stats['throughput'] = 1.0 / stats['avg_write_time'] if stats['avg_write_time'] else 0.0
+        return stats
+
+
+class StdoutSink(OutputSink):
+    name = 'stdout'
+
+    def write(self, reading):
+        print_measurement(
+            reading.bme_data,
+            reading.mq7_data,
+            reading.measurement_count,
+            gas_data=reading.gas_data,
+            scan_time=reading.scan_time,
+            scan_budget=reading.scan_budget
+        )
+
+
+class MQTTSink(OutputSink):
+    name = 'mqtt'
+
+    def __init__(self, publisher, **kwargs):
+        super().__init__(**kwargs)
+        self.publisher = publisher
+        self.published_interval = None
+
+    def write(self, reading):
+        self.publisher.publish_sensor_data(reading.bme_data, reading.mq7_data, reading.gas_data)
+
+        if reading.interval != self.published_interval and self.publisher.connected:
+            self.publisher.publish_measurement_interval(reading.interval)
+            self.published_interval = reading.interval
+
+
+class ThingSpeakSink(OutputSink):
+    name = 'thingspeak'
+
+    FIELDS = {
+        'field1': ('bme_data', 'temperature'),
+        'field2': ('bme_data', 'humidity'),
+        'field3': ('bme_data', 'pressure'),
+        'field4': ('mq7_data', 'co_ppm'),
+        'field5': ('bme_data', 'iaq'),
+        'field6': ('bme_data', 'gas_resistance'),
+        'field7': ('mq7_data', 'voltage')
+    }
+
+    def __init__(self, config, **kwargs):
+        super().__init__(**kwargs)
+        import requests
+        self.requests = requests
+        self.url = config['thingspeak_url']
+        self.write_key = config['thingspeak_write_key']
+        self.min_interval = config['thingspeak_min_interval']
+        self.last_update = 0
+
+    def write(self, reading):
+        # ThingSpeak rejects updates faster than its rate limit, so readings
+        # arriving in between are skipped rather than retried.
+        if time.time() - self.last_update < self.min_interval:
+            return
+
+        payload = {'api_key': self.write_key}
+        for field_num, (source, key) in self.FIELDS.items():
+            data = getattr(reading, source)
+            if data and data.get(key) is not None:
+                payload[field_num] = data[key]
+
+        if len(payload) == 1:
+            return
+
+        response = self.requests.get(self.url, params=payload, timeout=10, verify=True)
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code}")
+        if response.text.strip() in ('', '0'):
+            raise RuntimeError("Update rejected (rate limit or invalid data)")
+
+        self.last_update = time.time()
+
+
+class FileSink(OutputSink):
+    name = 'file'
+
+    def __init__(self, path, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.file = open(path, 'a')
+
+    def write(self, reading):
+        self.file.write(json.dumps(reading.to_dict()) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class HistorySink(OutputSink):
+    name = 'history'
+
+    def __init__(self, store, **kwargs):
+        super().__init__(**kwargs)
+        self.store = store
+
+    def write(self, reading):
+        self.store.add_reading(reading.bme_data, reading.mq7_data, reading.timestamp)
+        # Checkpointing runs here so disk writes never delay the measurement loop
+        self.store.maybe_checkpoint()
+
+
+class OutputPipeline:
+    def __init__(self):
+        self.sinks = []
+
+    def add(self, sink):
+        self.sinks.append(sink)
+        return sink
+
+    def start(self):
+        for sink in self.sinks:
+            sink.start()
+            print(f"✓ Output sink '{sink.name}' started "
+                  f"(queue {sink.queue.maxsize}, {sink.policy})")
+
+    def emit(self, reading):
+        for sink in self.sinks:
+            sink.emit(reading)
+
+    def stop(self, timeout=10):
+        for sink in self.sinks:
+            sink.stop(timeout=timeout)
+
+    def get_stats(self):
+        return {sink.name: sink.get_stats() for sink in self.sinks}
+
+    def print_stats(self):
+        for name, stats in self.get_stats().items():
+            print(f"  Sink {name:10s} written {stats['written']:6d} | "
+                  f"dropped {stats['dropped']:4d} | errors {stats['errors']:4d} | "
+                  f"max lag {stats['max_lag']:6.2f}s | {stats['throughput']:8.1f}/s")
@@ -0,0 +1,89 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from history_store import HISTORY_FIELDS
+
+
+class QueryRequestHandler(BaseHTTPRequestHandler):
+    store = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+        try:
+            if url.path == '/fields':
+                self.send_json(200, {'fields': HISTORY_FIELDS})
+            elif url.path == '/stats':
+                self.send_json(200, self.store.get_stats())
+            elif url.path == '/query':
+                self.send_json(200, self.handle_query(params))
+            else:
+                self.send_json(404, {'error': f"Unknown path: {url.path}"})
+        except ValueError as e:
+            self.send_json(400, {'error': str(e)})
+        except Exception as e:
+            self.send_json(500, {'error': str(e)})
+
+    def handle_query(self, params):
+        field = params.get('field')
+        if not field:
+            raise ValueError("Missing 'field' parameter")
+
+        now = time.time()
+        end = float(params.get('end', now))
+        if 'last' in params:
+            start = end - float(params['last'])
+        else:
+            start = float(params.get('start', end - 3600))
+
+        resolution = int(params.get('resolution', 60))
+
+        started = time.perf_counter()
+        result = self.store.query(field, start, end, resolution)
+        result = dict(result)
+        result['query_ms'] = round((time.perf_counter() - started) * 1000, 3)
+        return result
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class QueryServer:
+    def __init__(self, store, host='127.0.0.1', port=8080):
+        self.store = store
+        self.host = host
+        self.port = port
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        handler = type('BoundQueryRequestHandler', (QueryRequestHandler,), {'store': self.store})
+
+        try:
+            self.server = ThreadingHTTPServer((self.host, self.port), handler)
+        except OSError as e:
+            print(f"✗ Query API error: {e}")
+            return False
+
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        print(f"✓ Query API listening on http://{self.host}:{self.port}")
+        return True
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
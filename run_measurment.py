@@ -13,7 +13,21 @@ import adafruit_ads1x15.ads1115 as ADS
 from adafruit_ads1x15.analog_in import AnalogIn
 
 from mqtt_publisher import AirQualityMQTTPublisher
-from sensor_functions import read_bme680, read_mq7, print_measurement
+from history_store import HistoryStore
+from query_server import QueryServer
+from sensor_functions import read_bme680
+from adaptive_sampling import AdaptiveScheduler
+from channel_scanner import ChannelScanner, channel_topics, load_channel_config
+from gas_baseline import GasBaseline
+from output_sinks import (
+    FileSink,
+    HistorySink,
+    MQTTSink,
+    OutputPipeline,
+    Reading,
+    StdoutSink,
+    ThingSpeakSink
+)
 
 def load_config():
     load_dotenv()
@@ -28,6 +42,13 @@ def load_config():
         'use_tls': os.getenv('MQTT_USE_TLS', 'False').lower() == 'true',
         'client_id': os.getenv('MQTT_CLIENT_ID', 'airquality_sensor_rpi'),
         'ca_cert': os.getenv('MQTT_CA_CERT', '/etc/mosquitto/certs/ca.crt'),
+        'reconnect_min_delay': float(os.getenv('MQTT_RECONNECT_MIN_DELAY', 1)),
+        'reconnect_max_delay': float(os.getenv('MQTT_RECONNECT_MAX_DELAY', 120)),
+        'reconnect_jitter': float(os.getenv('MQTT_RECONNECT_JITTER', 0.5)),
+        'reconnect_stable_time': float(os.getenv('MQTT_RECONNECT_STABLE_TIME', 30)),
+        'outbox_size': int(os.getenv('MQTT_OUTBOX_SIZE', 1000)),
+        'use_v5': os.getenv('MQTT_V5', 'False').lower() == 'true',
+        'message_expiry': int(os.getenv('MQTT_MESSAGE_EXPIRY', 300)),
         'topics': {
             'temperature': f"{base_topic}/temperature",
             'humidity': f"{base_topic}/humidity",
@@ -35,9 +56,7 @@ def load_config():
             'gas_resistance': f"{base_topic}/gas_resistance",
             'air_quality_iaq': f"{base_topic}/air_quality_iaq",
             'air_quality_category': f"{base_topic}/air_quality_category",
-            'co_ppm': f"{base_topic}/co_ppm",
-            'co_voltage': f"{base_topic}/co_voltage",
-            'co_status': f"{base_topic}/co_status",
+            'measurement_interval': f"{base_topic}/measurement_interval",
             'availability': f"{base_topic}/availability",
             'status': f"{base_topic}/status"
         }
@@ -45,15 +64,55 @@ def load_config():
 
     sensor_config = {
         'measurement_interval': int(os.getenv('MEASUREMENT_INTERVAL', 10)),
+        'adaptive_sampling': os.getenv('ADAPTIVE_SAMPLING', 'False').lower() == 'true',
+        'min_interval': float(os.getenv('MEASUREMENT_INTERVAL_MIN', 2)),
+        'max_interval': float(os.getenv('MEASUREMENT_INTERVAL_MAX', 60)),
         'bme680_address': int(os.getenv('BME680_ADDRESS', '0x77'), 16),
         'ads1115_address': int(os.getenv('ADS1115_ADDRESS', '0x48'), 16),
         'mq7_channel': int(os.getenv('MQ7_CHANNEL', 0)),
         'sea_level_pressure': float(os.getenv('SEA_LEVEL_PRESSURE', 1013.25)),
         'mq7_r0': int(os.getenv('MQ7_R0', 10000)),
-        'mq7_rl': int(os.getenv('MQ7_RL', 10000))
+        'mq7_rl': int(os.getenv('MQ7_RL', 10000)),
+        'mq7_curve_a': float(os.getenv('MQ7_CURVE_A', 98.322)),
+        'mq7_curve_b': float(os.getenv('MQ7_CURVE_B', -1.458)),
+        'mq7_lookup_table': os.getenv('MQ7_LOOKUP_TABLE', 'True').lower() == 'true',
+        'ads1115_gain': 2 / 3 if os.getenv('ADS1115_GAIN', '1') == '2/3' else int(os.getenv('ADS1115_GAIN', 1)),
+        'calibration_cache_dir': os.getenv('CALIBRATION_CACHE_DIR', 'calibration_cache'),
+        'gas_baseline_file': os.getenv('GAS_BASELINE_FILE', 'gas_baseline.json'),
+        'gas_burn_in_samples': int(os.getenv('GAS_BURN_IN_SAMPLES', 300)),
+        'gas_baseline_checkpoint': int(os.getenv('GAS_BASELINE_CHECKPOINT', 300)),
+        'analog_scan_budget_ms': int(os.getenv('ANALOG_SCAN_BUDGET_MS', 100))
+    }
+
+    sensor_config['analog_channels'] = load_channel_config(
+        os.getenv('ANALOG_CHANNELS_FILE'),
+        sensor_config
+    )
+    mqtt_config['topics'].update(channel_topics(base_topic, sensor_config['analog_channels']))
+
+    history_config = {
+        'enabled': os.getenv('QUERY_API_ENABLED', 'False').lower() == 'true',
+        'host': os.getenv('QUERY_API_HOST', '127.0.0.1'),
+        'port': int(os.getenv('QUERY_API_PORT', 8080)),
+        'raw_retention': int(os.getenv('HISTORY_RAW_RETENTION', 3600)),
+        'minute_retention': int(os.getenv('HISTORY_MINUTE_RETENTION', 2 * 86400)),
+        'hour_retention': int(os.getenv('HISTORY_HOUR_RETENTION', 90 * 86400)),
+        'path': os.getenv('HISTORY_FILE', 'history.jsonl'),
+        'checkpoint_interval': int(os.getenv('HISTORY_CHECKPOINT', 300)),
+        'cache_size': int(os.getenv('QUERY_API_CACHE_SIZE', 128))
+    }
+
+    output_config = {
+        'sinks': [s.strip() for s in os.getenv('OUTPUT_SINKS', 'stdout,mqtt').split(',') if s.strip()],
+        'queue_size': int(os.getenv('SINK_QUEUE_SIZE', 100)),
+        'policy': os.getenv('SINK_POLICY', 'drop_oldest'),
+        'file_path': os.getenv('FILE_SINK_PATH', 'measurements.jsonl'),
+        'thingspeak_url': os.getenv('THINGSPEAK_URL', 'https://api.thingspeak.com/update'),
+        'thingspeak_write_key': os.getenv('THINGSPEAK_WRITE_KEY', ''),
+        'thingspeak_min_interval': int(os.getenv('THINGSPEAK_MIN_INTERVAL', 15))
     }
     
-    return mqtt_config, sensor_config
+    return mqtt_config, sensor_config, history_config, output_config
 
 class AirQualityMonitor:
     def __init__(self):
@@ -64,11 +123,21 @@ class AirQualityMonitor:
         print()
         
         print("Loading configuration...")
-        self.mqtt_config, self.sensor_config = load_config()
+        (self.mqtt_config, self.sensor_config,
+         self.history_config, self.output_config) = load_config()
         print("✓ Configuration loaded from .env")
         
         self.running = True
         self.measurement_count = 0
+        self.start_time = time.time()
+
+        self.scheduler = None
+        if self.sensor_config['adaptive_sampling']:
+            self.scheduler = AdaptiveScheduler({
+                'min_interval': self.sensor_config['min_interval'],
+                'max_interval': self.sensor_config['max_interval'],
+                'initial_interval': self.sensor_config['measurement_interval']
+            })
         
         signal.signal(signal.SIGINT, self.signal_handler)
         signal.signal(signal.SIGTERM, self.signal_handler)
@@ -92,35 +161,106 @@ class AirQualityMonitor:
         except Exception as e:
             print(f"⚠ BME680 unavailable: {e}")
             self.bme680 = None
+
+        self.gas_baseline = None
+        if self.bme680:
+            self.gas_baseline = GasBaseline({
+                'path': self.sensor_config['gas_baseline_file'],
+                'burn_in_samples': self.sensor_config['gas_burn_in_samples'],
+                'checkpoint_interval': self.sensor_config['gas_baseline_checkpoint'],
+                'sensor_id': f"{self.mqtt_config['client_id']}/bme680@0x{self.sensor_config['bme680_address']:02X}"
+            })
+            if self.gas_baseline.load() and self.gas_baseline.is_calibrated():
+                print(f"✓ Gas baseline restored ({self.gas_baseline.gas_baseline:.0f} O, "
+                      f"{self.gas_baseline.humidity_baseline:.1f} %RH)")
+            else:
+                remaining = self.gas_baseline.burn_in_samples - self.gas_baseline.samples
+                print(f"⚠ Gas baseline burn-in: {remaining} samples until calibrated IAQ")
         
-        print("\nInitializing MQ-7 (via ADS1115)...")
-        try:
-            self.ads = ADS.ADS1115(
-                self.i2c, 
-                address=self.sensor_config['ads1115_address']
-            )
-            self.mq7_channel = AnalogIn(
-                self.ads, 
-                self.sensor_config['mq7_channel']
-            )
-            print(f"✓ MQ-7 initialized (ADS1115 @ 0x{self.sensor_config['ads1115_address']:02X})")
-        except Exception as e:
-            print(f"⚠ MQ-7 unavailable: {e}")
-            self.ads = None
-            self.mq7_channel = None
+        print("\nInitializing analog gas sensors (via ADS1115)...")
+        self.scanner = ChannelScanner(
+            self.sensor_config['analog_channels'],
+            ads_factory=lambda address: ADS.ADS1115(self.i2c, address=address),
+            analog_in_factory=AnalogIn,
+            config={
+                'scan_budget_ms': self.sensor_config['analog_scan_budget_ms'],
+                'cache_dir': self.sensor_config['calibration_cache_dir']
+            }
+        )
+        self.scanner.load_tables(self.sensor_config['mq7_lookup_table'])
+        for channel in self.scanner.channels:
+            print(f"✓ {channel.label} initialized "
+                  f"(ADS1115 @ 0x{channel.address:02X} A{channel.channel}, {channel.data_rate} SPS)")
+        if self.scanner.channels:
+            expected = self.scanner.expected_scan_time() * 1000
+            budget = self.sensor_config['analog_scan_budget_ms']
+            if self.scanner.fits_budget():
+                print(f"✓ Expected scan time: {expected:.1f} ms (budget {budget} ms)")
+            else:
+                print(f"⚠ Expected scan time {expected:.1f} ms exceeds ANALOG_SCAN_BUDGET_MS "
+                      f"({budget} ms); raise data_rate on fixed-rate channels "
+                      f"or raise the budget")
 
         print("\nInitializing MQTT...")
         self.mqtt = AirQualityMQTTPublisher(self.mqtt_config)
         
         if not self.mqtt.connect():
-            print("Cannot connect to MQTT")
-            print("Continuing without MQTT (local logs only)")
+            print("Cannot connect to MQTT yet")
+            print("Continuing with local logs, reconnecting in background")
+
+        self.history = None
+        self.query_server = None
+        if self.history_config['enabled']:
+            print("\nInitializing local query API...")
+            self.history = HistoryStore(self.history_config)
+            if self.history.load():
+                stats = self.history.get_stats()
+                print(f"✓ History restored ({stats['minute_buckets']} minute, "
+                      f"{stats['hour_buckets']} hour buckets)")
+            self.query_server = QueryServer(
+                self.history,
+                host=self.history_config['host'],
+                port=self.history_config['port']
+            )
+            if not self.query_server.start():
+                self.query_server = None
+
+        print("\nInitializing outputs...")
+        self.outputs = self.create_outputs()
         
         print("\n" + "=" * 80)
         print("System ready")
         print("=" * 80)
         print()
     
+    def create_outputs(self):
+        pipeline = OutputPipeline()
+        options = {
+            'queue_size': self.output_config['queue_size'],
+            'policy': self.output_config['policy']
+        }
+
+        for name in self.output_config['sinks']:
+            try:
+                if name == 'stdout':
+                    pipeline.add(StdoutSink(**options))
+                elif name == 'mqtt':
+                    pipeline.add(MQTTSink(self.mqtt, **options))
+                elif name == 'thingspeak':
+                    pipeline.add(ThingSpeakSink(self.output_config, **options))
+                elif name == 'file':
+                    pipeline.add(FileSink(self.output_config['file_path'], **options))
+                else:
+                    print(f"⚠ Unknown output sink: {name}")
+            except Exception as e:
+                print(f"⚠ Output sink '{name}' unavailable: {e}")
+
+        if self.history:
+            pipeline.add(HistorySink(self.history, **options))
+
+        pipeline.start()
+        return pipeline
+
     def signal_handler(self, sig, frame):
         print("\n\n" + "=" * 80)
         print("Stopping system...")
@@ -129,7 +269,11 @@ class AirQualityMonitor:
     
     def run(self):
         interval = self.sensor_config['measurement_interval']
-        print(f"\nStarting monitoring (interval: {interval}s)")
+        if self.scheduler:
+            print(f"\nStarting monitoring (adaptive interval: "
+                  f"{self.scheduler.min_interval:g}-{self.scheduler.max_interval:g}s)")
+        else:
+            print(f"\nStarting monitoring (interval: {interval}s)")
         print(f"Press Ctrl+C to stop\n")
         
         self.mqtt.publish_status("System started")
@@ -138,21 +282,33 @@ class AirQualityMonitor:
             while self.running:
                 self.measurement_count += 1
                 
-                bme_data = read_bme680(self.bme680)
-                mq7_data = read_mq7(
-                    self.mq7_channel,
-                    R0=self.sensor_config['mq7_r0'],
-                    RL=self.sensor_config['mq7_rl']
-                )
-
-                print_measurement(bme_data, mq7_data, self.measurement_count)
-                
-                self.mqtt.publish_sensor_data(bme_data, mq7_data)
+                bme_data = read_bme680(self.bme680, self.gas_baseline)
+                if self.gas_baseline:
+                    self.gas_baseline.maybe_checkpoint()
+                mq7_data, gas_data = self.scanner.split_readings(self.scanner.scan())
+
+                if self.scheduler:
+                    previous = interval
+                    interval = self.scheduler.next_interval(bme_data, mq7_data)
+                    if round(interval, 1) != round(previous, 1):
+                        print(f"Measurement interval: {interval:.1f}s "
+                              f"(activity {self.scheduler.activity:.2f})")
+
+                self.outputs.emit(Reading(
+                    bme_data, mq7_data, self.measurement_count, interval,
+                    gas_data=gas_data,
+                    scan_time=self.scanner.last_scan_time,
+                    scan_budget=self.scanner.budget
+                ))
                 
-                for _ in range(interval):
-                    if not self.running:
+                # Monotonic clock: an NTP step on a Pi without RTC must not
+                # stretch or cut the wait.
+                deadline = time.monotonic() + interval
+                while self.running:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
                         break
-                    time.sleep(1)
+                    time.sleep(min(1, remaining))
         
         except Exception as e:
             print(f"\nCritical error: {e}")
@@ -163,13 +319,44 @@ class AirQualityMonitor:
     
     def cleanup(self):
         print("\nClosing connections...")
+
+        self.outputs.stop()
+
+        if self.gas_baseline and self.gas_baseline.save():
+            print(f"✓ Gas baseline saved to {self.gas_baseline.path}")
+
+        if self.history and self.history.save():
+            print(f"✓ History saved to {self.history.path}")
         
         self.mqtt.publish_status("System stopped")
         self.mqtt.disconnect()
+
+        if self.query_server:
+            self.query_server.stop()
         
         print(f"\nStatistics:")
         print(f"  Measurements:    {self.measurement_count}")
-        print(f"  Runtime:         ~{self.measurement_count * self.sensor_config['measurement_interval'] // 60} minutes")
+        print(f"  Runtime:         ~{int(time.time() - self.start_time) // 60} minutes")
+        if self.scanner.scans:
+            print(f"  Analog scan:     {self.scanner.last_scan_time * 1000:.1f} ms last, "
+                  f"{self.scanner.max_scan_time * 1000:.1f} ms max, "
+                  f"{self.scanner.over_budget} over budget")
+
+        mqtt_stats = self.mqtt.get_stats()
+        print(f"  MQTT attempts:   {mqtt_stats['connect_attempts']}")
+        print(f"  MQTT reconnects: {mqtt_stats['reconnects']}")
+        print(f"  MQTT downtime:   {mqtt_stats['total_downtime']:.1f}s")
+        if mqtt_stats['last_time_to_reconnect'] is not None:
+            print(f"  Last reconnect:  {mqtt_stats['last_time_to_reconnect']:.1f}s")
+        if mqtt_stats['outbox_expired']:
+            print(f"  MQTT expired:    {mqtt_stats['outbox_expired']} queued readings")
+
+        savings = self.mqtt.get_byte_savings()
+        if self.mqtt.use_v5 and savings:
+            print(f"  MQTT v5 savings: {savings['bytes_per_message']:.1f} B/msg "
+                  f"({savings['percent']:.1f}% over {savings['messages']} msgs)")
+
+        self.outputs.print_stats()
         print("\nSystem stopped")
         print("=" * 80)
 
@@ -1,9 +1,12 @@
 import time
 
-def calculate_iaq(gas_resistance, humidity):
+def calculate_iaq(gas_resistance, humidity, baseline=None):
     if gas_resistance == 0:
         return 500
 
+    if baseline and baseline.is_calibrated():
+        return 500 - baseline.score(gas_resistance, humidity) * 5
+
     gas_score = min(100, (gas_resistance / 2000))
 
     hum_score = 100 - abs(humidity - 40) * 2.5
@@ -14,23 +17,20 @@ def calculate_iaq(gas_resistance, humidity):
     return 500 - iaq
 
 
+IAQ_CATEGORIES = [(50, "Excellent"), (100, "Good"), (150, "Ok"), (200, "Not Good")]
+
+
 def get_iaq_category(iaq):
-    if iaq < 50:
-        return "Excellent"
-    elif iaq < 100:
-        return "Good"
-    elif iaq < 150:
-        return "Ok"
-    elif iaq < 200:
-        return "Not Good"
-    else:
-        return "Bad"
+    for limit, category in IAQ_CATEGORIES:
+        if iaq < limit:
+            return category
+    return "Bad"
 
-def calculate_co_ppm(voltage, R0=10000, RL=10000):
+def calculate_co_ppm(voltage, R0=10000, RL=10000, curve_a=98.322, curve_b=-1.458, vcc=5.0):
     if voltage < 0.1:
         return 0
     
-    Rs = ((5.0 * RL) / voltage) - RL
+    Rs = ((vcc * RL) / voltage) - RL
     
     if Rs <= 0:
         return 0
@@ -38,24 +38,23 @@ def calculate_co_ppm(voltage, R0=10000, RL=10000):
     ratio = Rs / R0
     
     try:
-        co_ppm = 98.322 * (ratio ** -1.458)
+        co_ppm = curve_a * (ratio ** curve_b)
         return max(0, min(2000, co_ppm))
     except:
         return 0
 
 
+CO_STATUSES = [(9, "Safe"), (50, "Acceptable"), (200, "Warning")]
+
+
 def get_co_status(co_ppm):
-    if co_ppm < 9:
-        return "Safe"
-    elif co_ppm < 50:
-        return "Acceptable"
-    elif co_ppm < 200:
-        return "Warning"
-    else:
-        return "ALARM"
+    for limit, status in CO_STATUSES:
+        if co_ppm < limit:
+            return status
+    return "ALARM"
 
 
-def read_bme680(sensor):
+def read_bme680(sensor, baseline=None):
     if not sensor:
         return None
     
@@ -65,7 +64,9 @@ def read_bme680(sensor):
         pres = sensor.pressure
         gas = sensor.gas
         
-        iaq = calculate_iaq(gas, hum)
+        if baseline:
+            baseline.update(gas, hum)
+        iaq = calculate_iaq(gas, hum, baseline)
         iaq_category = get_iaq_category(iaq)
         
         return {
@@ -82,14 +83,19 @@ def read_bme680(sensor):
         return None
 
 
-def read_mq7(mq7_channel, R0=10000, RL=10000):
+def read_mq7(mq7_channel, R0=10000, RL=10000, calibration=None):
     if not mq7_channel:
         return None
     
     try:
-        voltage = mq7_channel.voltage
         raw_value = mq7_channel.value
-        co_ppm = calculate_co_ppm(voltage, R0, RL)
+        if calibration:
+            # One conversion per sample: voltage and ppm both derive from raw_value
+            voltage = calibration.voltage(raw_value)
+            co_ppm = calibration.lookup(raw_value)
+        else:
+            voltage = mq7_channel.voltage
+            co_ppm = calculate_co_ppm(voltage, R0, RL)
         co_status = get_co_status(co_ppm)
         
         return {
@@ -103,7 +109,8 @@ def read_mq7(mq7_channel, R0=10000, RL=10000):
         print(f"MQ-7 read error: {e}")
         return None
 
-def print_measurement(bme_data, mq7_data, measurement_count):    
+def print_measurement(bme_data, mq7_data, measurement_count, gas_data=None, scan_time=None,
+                      scan_budget=None):    
     print("-" * 80)
     print(f"Measurement #{measurement_count:04d} | {time.strftime('%Y-%m-%d %H:%M:%S')}")
     print("-" * 80)
@@ -133,6 +140,18 @@ def print_measurement(bme_data, mq7_data, measurement_count):
             print("!" * 80)
     else:
         print("\nMQ-7: No data")
+
+    for data in (gas_data or {}).values():
+        print(f"\n{data['label']}:")
+        print(f"  Concentration:        {data['ppm']:6.1f} ppm")
+        print(f"  Voltage:              {data['voltage']:6.3f} V")
+        print(f"  ADC Raw:              {data['raw_value']:6d}")
+        print(f"  Status:               {data['status']}")
+
+    if scan_time is not None:
+        print(f"\nAnalog scan time:       {scan_time * 1000:6.1f} ms")
+        if scan_budget is not None and scan_time > scan_budget:
+            print(f"  ⚠ Over the {scan_budget * 1000:.0f} ms scan budget (ANALOG_SCAN_BUDGET_MS)")
     
     print("\n" + "-" * 80)
 
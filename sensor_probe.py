@@ -0,0 +1,354 @@
+import argparse
+import os
+import statistics
+import sys
+import time
+from dotenv import load_dotenv
+
+from channel_scanner import choose_data_rate
+from co_calibration import COCalibration
+from sensor_functions import calculate_co_ppm, read_bme680, read_mq7
+from simulated_devices import (
+    ADS1115_GAINS,
+    ADS1115_RATES,
+    SimulatedADS1115,
+    SimulatedAnalogIn,
+    SimulatedBME680,
+    SimulatedI2C
+)
+
+BME680_PROPERTIES = ['temperature', 'humidity', 'pressure', 'gas']
+HISTOGRAM_WIDTH = 40
+
+
+def load_config():
+    load_dotenv()
+
+    return {
+        'bme680_address': int(os.getenv('BME680_ADDRESS', '0x77'), 16),
+        'ads1115_address': int(os.getenv('ADS1115_ADDRESS', '0x48'), 16),
+        'mq7_channel': int(os.getenv('MQ7_CHANNEL', 0)),
+        'mq7_r0': int(os.getenv('MQ7_R0', 10000)),
+        'mq7_rl': int(os.getenv('MQ7_RL', 10000)),
+        'mq7_curve_a': float(os.getenv('MQ7_CURVE_A', 98.322)),
+        'mq7_curve_b': float(os.getenv('MQ7_CURVE_B', -1.458)),
+        'mq7_lookup_table': os.getenv('MQ7_LOOKUP_TABLE', 'True').lower() == 'true',
+        'ads1115_gain': 2 / 3 if os.getenv('ADS1115_GAIN', '1') == '2/3' else int(os.getenv('ADS1115_GAIN', 1)),
+        'calibration_cache_dir': os.getenv('CALIBRATION_CACHE_DIR', 'calibration_cache'),
+        'analog_scan_budget_ms': int(os.getenv('ANALOG_SCAN_BUDGET_MS', 100))
+    }
+
+
+def build_calibration(config):
+    # Same parameters run_measurment.py gives the 'co' channel
+    return COCalibration(
+        R0=config['mq7_r0'],
+        RL=config['mq7_rl'],
+        gain=config['ads1115_gain'],
+        curve={'a': config['mq7_curve_a'], 'b': config['mq7_curve_b']},
+        cache_dir=config['calibration_cache_dir']
+    )
+
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Probe configured I2C sensors and benchmark read latency"
+    )
+    parser.add_argument('--simulate', action='store_true',
+                        help="use simulated BME680/ADS1115 instead of hardware")
+    parser.add_argument('--samples', type=positive_int, default=20,
+                        help="reads per measured operation (default: 20)")
+    parser.add_argument('--rates', default=','.join(str(r) for r in ADS1115_RATES),
+                        help="comma-separated ADS1115 data rates to test")
+    parser.add_argument('--gains', default='1',
+                        help="comma-separated ADS1115 gains to test, 'all' for every gain")
+    parser.add_argument('--skip-bme680', action='store_true')
+    parser.add_argument('--skip-ads1115', action='store_true')
+    parser.add_argument('--skip-co-table', action='store_true')
+    return parser.parse_args()
+
+
+def open_devices(config, simulate):
+    if simulate:
+        i2c = SimulatedI2C([config['bme680_address'], config['ads1115_address']])
+        bme680 = SimulatedBME680(i2c, address=config['bme680_address'])
+        ads = SimulatedADS1115(i2c, address=config['ads1115_address'])
+        channel = SimulatedAnalogIn(ads, config['mq7_channel'])
+        return i2c, bme680, ads, channel
+
+    import board
+    import busio
+    from adafruit_bme680 import Adafruit_BME680_I2C
+    import adafruit_ads1x15.ads1115 as ADS
+    from adafruit_ads1x15.analog_in import AnalogIn
+
+    i2c = busio.I2C(board.SCL, board.SDA)
+
+    try:
+        bme680 = Adafruit_BME680_I2C(i2c, address=config['bme680_address'])
+    except Exception as e:
+        print(f"⚠ BME680 unavailable: {e}")
+        bme680 = None
+
+    try:
+        ads = ADS.ADS1115(i2c, address=config['ads1115_address'])
+        channel = AnalogIn(ads, config['mq7_channel'])
+    except Exception as e:
+        print(f"⚠ ADS1115 unavailable: {e}")
+        ads = None
+        channel = None
+
+    return i2c, bme680, ads, channel
+
+
+def scan_bus(i2c, config):
+    while not i2c.try_lock():
+        pass
+
+    try:
+        started = time.perf_counter()
+        found = i2c.scan()
+        elapsed = time.perf_counter() - started
+    finally:
+        i2c.unlock()
+
+    print(f"I2C scan: {len(found)} device(s) in {elapsed * 1000:.2f} ms")
+    print(f"  Found: {', '.join(f'0x{a:02X}' for a in found) or 'none'}")
+
+    for name in ['bme680_address', 'ads1115_address']:
+        address = config[name]
+        mark = "✓" if address in found else "✗"
+        print(f"  {mark} {name.replace('_address', '').upper()} @ 0x{address:02X}")
+
+    return found
+
+
+def time_call(func, samples, setup=None):
+    latencies = []
+    for _ in range(samples):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def summarize(latencies):
+    ordered = sorted(latencies)
+    mean = statistics.mean(ordered)
+    return {
+        'min': ordered[0],
+        'mean': mean,
+        'p50': ordered[len(ordered) // 2],
+        'p95': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        'max': ordered[-1],
+        'max_rate': 1.0 / mean if mean > 0 else float('inf')
+    }
+
+
+def print_histogram(label, latencies, bins=8):
+    summary = summarize(latencies)
+
+    print(f"\n{label}")
+    print(f"  min {summary['min'] * 1000:8.3f} ms | mean {summary['mean'] * 1000:8.3f} ms | "
+          f"p95 {summary['p95'] * 1000:8.3f} ms | max {summary['max'] * 1000:8.3f} ms")
+    print(f"  Max sample rate: {summary['max_rate']:8.1f} Hz")
+
+    low, high = summary['min'], summary['max']
+    width = (high - low) / bins or 1e-9
+    counts = [0] * bins
+    for latency in latencies:
+        index = min(bins - 1, int((latency - low) / width))
+        counts[index] += 1
+
+    peak = max(counts)
+    for i, count in enumerate(counts):
+        if count == 0 and high == low:
+            continue
+        bar = "#" * int(count / peak * HISTOGRAM_WIDTH)
+        print(f"  {(low + i * width) * 1000:8.3f} ms | {bar} {count}")
+
+    return summary
+
+
+def expire_bme680_cache(bme680):
+    # Adafruit_BME680 returns cached values for 1/refresh_rate after each
+    # measurement; forget the last one so the next access hits the sensor.
+    bme680._last_reading = 0
+
+
+def benchmark_bme680(bme680, samples):
+    print("\n" + "=" * 80)
+    print("BME680 property reads")
+    print("=" * 80)
+
+    refresh_time = getattr(bme680, '_min_refresh_time', 0)
+    print(f"Refresh cache: {refresh_time * 1000:.0f} ms (bypassed for every sample)")
+
+    results = {}
+    expire = lambda: expire_bme680_cache(bme680)
+    for prop in BME680_PROPERTIES:
+        latencies = time_call(lambda: getattr(bme680, prop), samples, setup=expire)
+        results[prop] = print_histogram(f"BME680.{prop} (forced measurement)", latencies)
+
+    latencies = time_call(lambda: read_bme680(bme680), samples, setup=expire)
+    results['read_bme680'] = print_histogram("read_bme680() (full reading)", latencies)
+
+    if refresh_time:
+        print(f"\n  Note: the driver caches readings, so the BME680 delivers at most "
+              f"{1.0 / refresh_time:.1f} new readings/s regardless of read latency")
+    return results
+
+
+def benchmark_ads1115(ads, channel, calibration, config, samples, rates, gains):
+    print("\n" + "=" * 80)
+    print("ADS1115 conversions")
+    print("=" * 80)
+
+    results = {}
+    original_rate, original_gain = ads.data_rate, ads.gain
+
+    try:
+        for gain in gains:
+            for rate in rates:
+                ads.gain = gain
+                ads.data_rate = rate
+                latencies = time_call(lambda: channel.value, samples)
+                results[(rate, gain)] = print_histogram(
+                    f"ADS1115 @ {rate} SPS, gain {gain:g}", latencies
+                )
+
+        # As the monitor reads it: configured gain, the rate the scanner
+        # picks for a single channel, one conversion through the calibration
+        ads.gain = config['ads1115_gain']
+        ads.data_rate = choose_data_rate(1, config['analog_scan_budget_ms'] / 1000)
+        latencies = time_call(
+            lambda: read_mq7(channel, R0=config['mq7_r0'], RL=config['mq7_rl'],
+                             calibration=calibration),
+            samples
+        )
+        mode = 'lookup table' if calibration.table is not None else 'analytic'
+        results['read_mq7'] = print_histogram(
+            f"read_mq7() (full reading @ {ads.data_rate} SPS, gain {ads.gain:g}, {mode})",
+            latencies
+        )
+    finally:
+        ads.data_rate, ads.gain = original_rate, original_gain
+
+    return results
+
+
+def load_table(calibration):
+    started = time.perf_counter()
+    calibration.load()
+    print(f"CO lookup table ready in {(time.perf_counter() - started) * 1000:.1f} ms "
+          f"({calibration.cache_path()})")
+
+
+def benchmark_co_conversion(calibration, samples):
+    print("\n" + "=" * 80)
+    print("CO conversion: analytic vs lookup table")
+    print("=" * 80)
+
+    if calibration.table is None:
+        load_table(calibration)
+    print(f"Validation against calculate_co_ppm: "
+          f"{'✓ exact' if calibration.validate() else '✗ MISMATCH'}")
+
+    raw_values = [(i * 7919) % 26000 for i in range(samples * 100)]
+    voltages = [calibration.voltage(raw) for raw in raw_values]
+
+    started = time.perf_counter()
+    for voltage in voltages:
+        calculate_co_ppm(voltage, calibration.R0, calibration.RL,
+                         calibration.curve_a, calibration.curve_b, calibration.vcc)
+    analytic = (time.perf_counter() - started) / len(voltages)
+
+    started = time.perf_counter()
+    for raw in raw_values:
+        calibration.lookup(raw)
+    lookup = (time.perf_counter() - started) / len(raw_values)
+
+    print(f"  calculate_co_ppm(): {analytic * 1e6:8.3f} µs/sample")
+    print(f"  lookup():           {lookup * 1e6:8.3f} µs/sample ({analytic / lookup:.1f}x)")
+
+
+def print_summary(bme_results, ads_results):
+    print("\n" + "=" * 80)
+    print("SUMMARY - maximum achievable sample rates")
+    print("=" * 80)
+
+    for name, summary in bme_results.items():
+        print(f"  BME680 {name:24s} {summary['max_rate']:8.1f} Hz")
+
+    for key, summary in ads_results.items():
+        if key == 'read_mq7':
+            name = 'read_mq7'
+        else:
+            name = f"{key[0]} SPS gain {key[1]:g}"
+        print(f"  ADS1115 {name:23s} {summary['max_rate']:8.1f} Hz")
+
+    if 'read_bme680' in bme_results and 'read_mq7' in ads_results:
+        cycle = bme_results['read_bme680']['mean'] + ads_results['read_mq7']['mean']
+        print(f"\n  Full measurement cycle: {cycle * 1000:.1f} ms "
+              f"({1.0 / cycle:.1f} Hz max)")
+
+    print("=" * 80)
+
+
+def main():
+    args = parse_args()
+    config = load_config()
+
+    rates = [int(r) for r in args.rates.split(',') if r]
+    if args.gains == 'all':
+        gains = list(ADS1115_GAINS)
+    else:
+        gains = [2 / 3 if g == '2/3' else float(g) if '.' in g else int(g)
+                 for g in args.gains.split(',') if g]
+
+    print("=" * 80)
+    print("  SENSOR PROBE / I2C LATENCY BENCHMARK")
+    print(f"  Mode: {'simulated devices' if args.simulate else 'hardware'}")
+    print("=" * 80)
+
+    try:
+        i2c, bme680, ads, channel = open_devices(config, args.simulate)
+    except Exception as e:
+        print(f"✗ I2C error: {e}")
+        sys.exit(1)
+
+    scan_bus(i2c, config)
+
+    calibration = build_calibration(config)
+    if config['mq7_lookup_table']:
+        load_table(calibration)
+
+    bme_results = {}
+    ads_results = {}
+
+    if bme680 and not args.skip_bme680:
+        bme_results = benchmark_bme680(bme680, args.samples)
+
+    if ads and channel and not args.skip_ads1115:
+        ads_results = benchmark_ads1115(ads, channel, calibration, config, args.samples, rates, gains)
+
+    if not args.skip_co_table:
+        benchmark_co_conversion(calibration, args.samples)
+
+    print_summary(bme_results, ads_results)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\nInterrupted")
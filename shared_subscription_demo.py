@@ -0,0 +1,184 @@
+import argparse
+import json
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+import paho.mqtt.client as mqtt
+
+from thingspeak_subscriber import ThingSpeakBridge
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Run several ThingSpeakBridge instances against one broker and check "
+                    "per-device ordering across the whole group"
+    )
+    parser.add_argument('--broker', default='localhost')
+    parser.add_argument('--port', type=int, default=1883)
+    parser.add_argument('--username', default='')
+    parser.add_argument('--password', default='')
+    parser.add_argument('--base-topic', default='demo/airquality')
+    parser.add_argument('--group', default='thingspeak_bridge_demo')
+    parser.add_argument('--bridges', type=int, default=3)
+    parser.add_argument('--devices', type=int, default=4)
+    parser.add_argument('--messages', type=int, default=50,
+                        help="messages per device (default: 50)")
+    parser.add_argument('--partitioned', action='store_true',
+                        help="partition devices between bridges (BRIDGE_DEVICES) "
+                             "instead of a round-robin shared subscription")
+    return parser.parse_args()
+
+
+class GroupLog:
+    # Order in which readings are accepted across all bridges of the group
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.accepted = []
+
+    def record(self, device, sent_at, bridge):
+        with self.lock:
+            self.accepted.append((device, sent_at, bridge))
+
+    def out_of_order(self):
+        newest = {}
+        count = 0
+        for device, sent_at, _ in self.accepted:
+            if device in newest and sent_at < newest[device]:
+                count += 1
+            else:
+                newest[device] = sent_at
+        return count
+
+    def bridges_per_device(self):
+        bridges = defaultdict(set)
+        for device, _, bridge in self.accepted:
+            bridges[device].add(bridge)
+        return bridges
+
+
+class DemoBridge(ThingSpeakBridge):
+    def __init__(self, index, config, log):
+        super().__init__(config)
+        self.index = index
+        self.log = log
+        self.subscribed = threading.Event()
+        self.mqtt_client.on_subscribe = self.on_subscribe
+        self.thread = None
+
+    def on_subscribe(self, client, userdata, mid, reason_codes, properties=None):
+        self.subscribed.set()
+
+    def is_stale(self, topic, sent_at):
+        stale = super().is_stale(topic, sent_at)
+        if not stale:
+            self.log.record(topic.rsplit('/', 1)[0], sent_at, self.index)
+        return stale
+
+    def send_to_thingspeak(self, device):
+        # Stand-in for the HTTP update: forward the device buffer and reset it
+        self.last_update[self.write_key(device)] = time.time()
+        self.stats['thingspeak_updates'] += 1
+        del self.data_buffer[device]
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=15)
+
+
+def bridge_config(args, index, devices):
+    return {
+        'mqtt_broker': args.broker,
+        'mqtt_port': args.port,
+        'mqtt_username': args.username,
+        'mqtt_password': args.password,
+        'mqtt_base_topic': args.base_topic,
+        'mqtt_v5': True,
+        'share_group': args.group,
+        'session_expiry': 10,
+        'instance_id': '' if args.partitioned else f"demo-{index}",
+        'devices': {device: '' for device in devices} if args.partitioned else {},
+        'discovery_topic': f"{args.base_topic}/+/availability",
+        'partitions': args.bridges,
+        'partition': index,
+        'thingspeak_url': '',
+        'thingspeak_write_key': '',
+        'thingspeak_channel_id': 'demo',
+        'thingspeak_min_interval': 0,
+        'ingest_queue_size': 1000,
+        'ingest_batch_size': 20,
+        'ingest_batch_wait': 0.1,
+        'field_mapping': {'field1': 'temperature'}
+    }
+
+
+def main():
+    args = parse_args()
+    devices = [f"{args.base_topic}/device{d}" for d in range(args.devices)]
+    log = GroupLog()
+
+    bridges = [DemoBridge(i, bridge_config(args, i, devices), log) for i in range(args.bridges)]
+    for bridge in bridges:
+        bridge.start()
+
+    for bridge in bridges:
+        if bridge.subscribe_topics and not bridge.subscribed.wait(timeout=10):
+            print(f"✗ Bridge {bridge.index} did not subscribe (is the broker MQTT v5 capable?)")
+            for b in bridges:
+                b.stop()
+            return
+
+    publisher = mqtt.Client(client_id="airquality_demo_publisher", protocol=mqtt.MQTTv5)
+    if args.username:
+        publisher.username_pw_set(args.username, args.password)
+    publisher.connect(args.broker, args.port)
+    publisher.loop_start()
+
+    for seq in range(args.messages):
+        for device in devices:
+            payload = json.dumps({
+                'value': seq,
+                'timestamp': datetime.now().isoformat()
+            })
+            publisher.publish(f"{device}/temperature", payload, qos=1)
+
+    time.sleep(3)
+    publisher.loop_stop()
+    publisher.disconnect()
+
+    for bridge in bridges:
+        bridge.stop()
+
+    print("\n" + "=" * 80)
+    print("  SHARED SUBSCRIPTION DEMO - GROUP RESULT")
+    print("=" * 80)
+    print(f"Mode:     {'partitioned by device' if args.partitioned else 'round-robin $share group'}")
+    print(f"Bridges:  {args.bridges}, devices: {args.devices}, messages/device: {args.messages}")
+
+    total = 0
+    for bridge in bridges:
+        total += bridge.stats['mqtt_received']
+        print(f"Bridge {bridge.index}: {bridge.stats['mqtt_received']:5d} received, "
+              f"{bridge.stats['out_of_order']} dropped as stale locally")
+
+    expected = args.devices * args.messages
+    mark = "✓" if total == expected else "✗"
+    print(f"\n{mark} {total}/{expected} messages delivered exactly once across the group")
+
+    spread = log.bridges_per_device()
+    shared = [device for device, owners in spread.items() if len(owners) > 1]
+    print(f"Devices handled by more than one bridge: {len(shared)}/{len(spread)}")
+
+    out_of_order = log.out_of_order()
+    mark = "✓" if out_of_order == 0 else "✗"
+    print(f"{mark} {out_of_order} readings applied out of order across the group")
+
+
+if __name__ == "__main__":
+    main()
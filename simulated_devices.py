@@ -0,0 +1,118 @@
+import math
+import random
+import time
+
+from co_calibration import ADS1115_PGA_RANGE, ADS1115_RATES
+
+
+ADS1115_GAINS = tuple(ADS1115_PGA_RANGE)
+
+# Approximate bus cost of one register transaction at 100 kHz
+I2C_TRANSACTION_TIME = 0.0004
+
+
+class SimulatedI2C:
+    def __init__(self, addresses=(0x77, 0x48)):
+        self.addresses = list(addresses)
+        self.locked = False
+
+    def try_lock(self):
+        if self.locked:
+            return False
+        self.locked = True
+        return True
+
+    def unlock(self):
+        self.locked = False
+
+    def scan(self):
+        time.sleep(I2C_TRANSACTION_TIME * 4)
+        return list(self.addresses)
+
+
+class SimulatedBME680:
+    # Like Adafruit_BME680, every property triggers a full forced-mode
+    # measurement (including the gas heater cycle) unless the previous one
+    # is younger than 1/refresh_rate, in which case the cached values are
+    # returned without touching the bus.
+    def __init__(self, i2c=None, address=0x77, gas_heater_time=0.15, refresh_rate=10):
+        self.i2c = i2c
+        self.address = address
+        self.gas_heater_time = gas_heater_time
+        self.sea_level_pressure = 1013.25
+        self.started = time.time()
+        self._min_refresh_time = 1 / refresh_rate
+        self._last_reading = 0
+        self._values = {}
+
+    def _elapsed(self):
+        return time.time() - self.started
+
+    def _perform_reading(self):
+        if time.monotonic() - self._last_reading < self._min_refresh_time:
+            return
+
+        time.sleep(self.gas_heater_time + I2C_TRANSACTION_TIME * 12)
+        elapsed = self._elapsed()
+        self._values = {
+            'temperature': 22.0 + math.sin(elapsed / 300) + random.gauss(0, 0.05),
+            'humidity': 42.0 + 3 * math.sin(elapsed / 600) + random.gauss(0, 0.2),
+            'pressure': self.sea_level_pressure + random.gauss(0, 0.1),
+            'gas': int(max(1000, 120000 + 20000 * math.sin(elapsed / 900) + random.gauss(0, 1500)))
+        }
+        self._last_reading = time.monotonic()
+
+    @property
+    def temperature(self):
+        self._perform_reading()
+        return self._values['temperature']
+
+    @property
+    def humidity(self):
+        self._perform_reading()
+        return self._values['humidity']
+
+    @property
+    def pressure(self):
+        self._perform_reading()
+        return self._values['pressure']
+
+    @property
+    def gas(self):
+        self._perform_reading()
+        return self._values['gas']
+
+
+class SimulatedADS1115:
+    rates = ADS1115_RATES
+    gains = ADS1115_GAINS
+
+    def __init__(self, i2c=None, address=0x48, channel_voltages=None):
+        self.i2c = i2c
+        self.address = address
+        self.data_rate = 128
+        self.gain = 1
+        self.channel_voltages = channel_voltages or {0: 0.45, 1: 0.9, 2: 1.2, 3: 0.3}
+
+    def read(self, channel):
+        time.sleep(1.0 / self.data_rate + I2C_TRANSACTION_TIME * 3)
+
+        full_scale = ADS1115_PGA_RANGE[self.gain]
+        voltage = self.channel_voltages.get(channel, 0.0) + random.gauss(0, 0.002)
+        voltage = max(-full_scale, min(full_scale, voltage))
+        return int(voltage / full_scale * 32767)
+
+
+class SimulatedAnalogIn:
+    def __init__(self, ads, channel):
+        self.ads = ads
+        self.channel = channel
+
+    @property
+    def value(self):
+        return self.ads.read(self.channel)
+
+    @property
+    def voltage(self):
+        raw = self.ads.read(self.channel)
+        return raw * ADS1115_PGA_RANGE[self.ads.gain] / 32767
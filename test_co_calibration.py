@@ -0,0 +1,160 @@
+import os
+
+import pytest
+
+from co_calibration import ADS1115_PGA_RANGE, TABLE_SIZE, COCalibration, raw_to_signed
+from sensor_functions import calculate_co_ppm
+
+CALIBRATIONS = [
+    {'R0': 10000, 'RL': 10000, 'gain': 1, 'curve': {'a': 98.322, 'b': -1.458}},
+    {'R0': 2500, 'RL': 1000, 'gain': 2 / 3, 'curve': {'a': 98.322, 'b': -1.458}},
+    {'R0': 40000, 'RL': 10000, 'gain': 2, 'curve': {'a': 110.47, 'b': -2.862}},
+    {'R0': 9800, 'RL': 4700, 'gain': 16, 'curve': {'a': 574.25, 'b': -2.222}},
+]
+
+
+def expected_ppm(calibration, raw_value):
+    # Independent of COCalibration.voltage(): two's complement by hand
+    raw_value &= 0xFFFF
+    signed = raw_value - 0x10000 if raw_value & 0x8000 else raw_value
+    voltage = signed * ADS1115_PGA_RANGE[calibration['gain']] / 32767
+    return calculate_co_ppm(
+        voltage,
+        R0=calibration['R0'],
+        RL=calibration['RL'],
+        curve_a=calibration['curve']['a'],
+        curve_b=calibration['curve']['b']
+    )
+
+
+@pytest.fixture(scope='module', params=CALIBRATIONS,
+                ids=lambda c: f"R0={c['R0']}-RL={c['RL']}-gain={c['gain']:g}")
+def calibrated(request):
+    calibration = COCalibration(**request.param)
+    calibration.load()
+    return request.param, calibration
+
+
+def test_table_matches_analytic_for_every_raw_value(calibrated):
+    params, calibration = calibrated
+
+    assert len(calibration.table) == TABLE_SIZE
+    mismatches = [
+        raw for raw in range(TABLE_SIZE)
+        if calibration.table[raw] != expected_ppm(params, raw)
+    ]
+    assert mismatches == []
+    assert calibration.validate()
+
+
+def test_lookup_handles_negative_and_wrapped_raw_values(calibrated):
+    params, calibration = calibrated
+
+    for signed in (-1, -2, -100, -32767, -32768):
+        wrapped = signed & 0xFFFF
+        assert raw_to_signed(wrapped) == signed
+        assert calibration.lookup(signed) == calibration.lookup(wrapped)
+        assert calibration.lookup(signed) == expected_ppm(params, signed)
+        # Negative input voltages are below the 0.1 V floor
+        assert calibration.lookup(signed) == 0
+
+    assert raw_to_signed(0x7FFF) == 32767
+    assert calibration.lookup(0x7FFF) == expected_ppm(params, 0x7FFF)
+
+
+def test_lookup_without_table_falls_back_to_analytic():
+    params = CALIBRATIONS[0]
+    calibration = COCalibration(**params)
+
+    assert calibration.table is None
+    for raw in (0, 1000, 12000, 32767, 0xFFFF, -5):
+        assert calibration.lookup(raw) == expected_ppm(params, raw)
+
+
+def test_table_covers_floor_clamp_and_saturation_branches():
+    params = CALIBRATIONS[1]
+    calibration = COCalibration(**params)
+    calibration.load()
+    full_scale = ADS1115_PGA_RANGE[params['gain']]
+
+    below_floor = int(0.099 * 32767 / full_scale)
+    assert calibration.lookup(below_floor) == 0
+
+    # At or above Vcc the sensor resistance is not positive
+    above_vcc = int(5.5 * 32767 / full_scale)
+    assert calibration.lookup(above_vcc) == 0
+
+    values = list(calibration.table)
+    assert max(values) == 2000
+    assert min(values) == 0
+    clamped = [raw for raw in range(TABLE_SIZE) if values[raw] == 2000]
+    assert all(expected_ppm(params, raw) == 2000 for raw in clamped)
+
+
+def test_cached_table_is_reused_when_calibration_unchanged(tmp_path, monkeypatch):
+    params = CALIBRATIONS[0]
+    first = COCalibration(cache_dir=str(tmp_path), **params)
+    first.load()
+    path = first.cache_path()
+    assert os.path.exists(path)
+    mtime = os.stat(path).st_mtime_ns
+
+    def fail_build(self):
+        raise AssertionError("table rebuilt although the cache is valid")
+
+    monkeypatch.setattr(COCalibration, 'build_table', fail_build)
+
+    second = COCalibration(cache_dir=str(tmp_path), **params)
+    second.load()
+    assert second.cache_path() == path
+    assert second.table == first.table
+    assert os.stat(path).st_mtime_ns == mtime
+
+
+@pytest.mark.parametrize('change', [
+    {'R0': 12000},
+    {'RL': 4700},
+    {'gain': 2},
+    {'curve': {'a': 99.0, 'b': -1.458}},
+    {'curve': {'a': 98.322, 'b': -1.5}},
+    {'vcc': 3.3},
+], ids=['R0', 'RL', 'gain', 'curve_a', 'curve_b', 'vcc'])
+def test_cached_table_is_rebuilt_when_calibration_changes(tmp_path, monkeypatch, change):
+    params = dict(CALIBRATIONS[0])
+    original = COCalibration(cache_dir=str(tmp_path), **params)
+    original.load()
+
+    builds = []
+    build_table = COCalibration.build_table
+
+    def counting_build(self):
+        builds.append(self)
+        return build_table(self)
+
+    monkeypatch.setattr(COCalibration, 'build_table', counting_build)
+
+    params.update(change)
+    changed = COCalibration(cache_dir=str(tmp_path), **params)
+    changed.load()
+
+    assert changed.cache_path() != original.cache_path()
+    assert builds == [changed]
+    assert os.path.exists(changed.cache_path())
+    assert os.path.exists(original.cache_path())
+    assert changed.validate()
+
+
+def test_mismatched_cache_file_is_rebuilt(tmp_path):
+    params = CALIBRATIONS[0]
+    calibration = COCalibration(cache_dir=str(tmp_path), **params)
+    calibration.load()
+
+    # A table under the right name but with wrong contents
+    wrong = COCalibration(**dict(params, R0=1000))
+    wrong.load()
+    with open(calibration.cache_path(), 'wb') as f:
+        wrong.table.tofile(f)
+
+    reloaded = COCalibration(cache_dir=str(tmp_path), **params)
+    reloaded.load()
+    assert reloaded.validate()
@@ -1,11 +1,17 @@
 import time
 import json
+import queue
 import signal
+import threading
 import sys
 import os
+import socket
+import zlib
 from datetime import datetime
 from dotenv import load_dotenv
 import paho.mqtt.client as mqtt
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
 import requests
 import traceback
 
@@ -18,11 +24,25 @@ def load_config():
         'mqtt_username': os.getenv('MQTT_USERNAME', 'airquality_sensor'),
         'mqtt_password': os.getenv('MQTT_PASSWORD', ''),
         'mqtt_base_topic': os.getenv('MQTT_BASE_TOPIC', 'home/airquality'),
+
+        'mqtt_v5': os.getenv('BRIDGE_MQTT_V5', 'False').lower() == 'true',
+        'share_group': os.getenv('BRIDGE_SHARE_GROUP', 'thingspeak_bridge'),
+        'session_expiry': int(os.getenv('BRIDGE_SESSION_EXPIRY', 300)),
+        'instance_id': os.getenv('BRIDGE_INSTANCE_ID', ''),
+        'devices': parse_devices(os.getenv('BRIDGE_DEVICES', '')),
+        'discovery_topic': os.getenv('BRIDGE_DISCOVERY_TOPIC', '+/+/availability'),
+        'partitions': int(os.getenv('BRIDGE_PARTITIONS', 1)),
+        'partition': int(os.getenv('BRIDGE_PARTITION', 0)),
         
         'thingspeak_url': os.getenv('THINGSPEAK_URL', 'https://api.thingspeak.com/update'),
         'thingspeak_write_key': os.getenv('THINGSPEAK_WRITE_KEY', ''),
         'thingspeak_channel_id': os.getenv('THINGSPEAK_CHANNEL_ID', ''),
         'thingspeak_min_interval': int(os.getenv('THINGSPEAK_MIN_INTERVAL', 15)),
+
+        'ingest_queue_size': int(os.getenv('INGEST_QUEUE_SIZE', 1000)),
+        'ingest_batch_size': int(os.getenv('INGEST_BATCH_SIZE', 100)),
+        'ingest_batch_wait': float(os.getenv('INGEST_BATCH_WAIT', 0.5)),
+        'ingest_queue_policy': os.getenv('INGEST_QUEUE_POLICY', 'drop_oldest'),
         
         'field_mapping': {
             'field1': 'temperature',
@@ -41,28 +61,117 @@ def load_config():
     
     return config
 
+
+def parse_devices(value):
+    # "home/salon=WRITE_KEY,home/kuchnia": device prefix with an optional
+    # ThingSpeak write key of its own channel
+    devices = {}
+    for entry in value.split(','):
+        prefix, _, write_key = entry.partition('=')
+        prefix = prefix.strip().strip('/')
+        if prefix:
+            devices[prefix] = write_key.strip()
+    return devices
+
+
+def device_partition(device, partitions):
+    # Stable across processes and restarts, unlike hash()
+    return zlib.crc32(device.encode()) % partitions
+
+
 class ThingSpeakBridge:
     def __init__(self, config):
         self.config = config
         self.running = True
-        self.last_update = 0
+        # Latest values per device; ThingSpeak rate limits per channel, so
+        # the last update time is kept per write key.
         self.data_buffer = {}
+        self.last_update = {}
+
+        self.ingest_queue = queue.Queue(maxsize=config['ingest_queue_size'])
+        self.ingest_policy = config.get('ingest_queue_policy', 'drop_oldest')
+        if self.ingest_policy not in ('drop_oldest', 'drop_newest'):
+            raise ValueError(f"Unknown ingest queue policy: {self.ingest_policy}")
+        self.ingest_thread = None
         
         self.stats = {
             'mqtt_messages': 0,
+            'mqtt_received': 0,
+            'queue_overflows': 0,
+            'queue_depth_max': 0,
+            'batches': 0,
+            'coalesced': 0,
+            'decode_errors': 0,
+            'batch_errors': 0,
+            'out_of_order': 0,
+            'unknown_device': 0,
             'thingspeak_updates': 0,
             'thingspeak_errors': 0,
             'start_time': time.time()
         }
 
+        # Newest publisher timestamp applied per (device, metric)
+        self.last_seen = {}
+
         signal.signal(signal.SIGINT, self.signal_handler)
         signal.signal(signal.SIGTERM, self.signal_handler)
         
-        self.mqtt_client = mqtt.Client(
-            client_id="thingspeak_bridge",
-            clean_session=True,
-            protocol=mqtt.MQTTv311
-        )
+        self.devices = None
+        self.unknown_devices = set()
+        if config['devices']:
+            if not 0 <= config['partition'] < config['partitions']:
+                raise ValueError(f"BRIDGE_PARTITION must be in 0..{config['partitions'] - 1}")
+            self.devices = [
+                device for device in config['devices']
+                if device_partition(device, config['partitions']) == config['partition']
+            ]
+
+        instance_id = config['instance_id']
+        if not instance_id and self.devices is not None:
+            # One instance per partition, so the partition names it
+            instance_id = f"p{config['partition']}of{config['partitions']}"
+
+        # A persistent session is only useful if the next run resumes it
+        # under the same client ID. With a throwaway ID it would just sit in
+        # the share group holding messages back until it expires.
+        self.persistent_session = config['mqtt_v5'] and bool(instance_id)
+        if not instance_id:
+            instance_id = f"{socket.gethostname()}-{os.getpid()}"
+
+        if self.devices is not None:
+            # Each device is subscribed by exactly one instance, so its
+            # messages arrive in order through a single session.
+            self.subscribe_topics = [f"{device}/#" for device in self.devices]
+            # A device missing from BRIDGE_DEVICES belongs to no partition;
+            # its availability messages are the only way to notice it.
+            if config['partition'] == 0 and config['discovery_topic']:
+                self.subscribe_topics.append(config['discovery_topic'])
+        elif config['mqtt_v5']:
+            # The broker hands consecutive messages of one device to
+            # different group members, so ordering is only best-effort.
+            self.subscribe_topics = [
+                f"$share/{config['share_group']}/{config['mqtt_base_topic']}/#"
+            ]
+        else:
+            self.subscribe_topics = [f"{config['mqtt_base_topic']}/#"]
+
+        if config['mqtt_v5']:
+            # Shared subscriptions split the load between bridge instances,
+            # so every instance needs its own client ID.
+            self.client_id = f"thingspeak_bridge-{instance_id}"
+            self.mqtt_client = mqtt.Client(
+                client_id=self.client_id,
+                protocol=mqtt.MQTTv5
+            )
+        else:
+            self.client_id = (
+                "thingspeak_bridge" if self.devices is None else f"thingspeak_bridge-{instance_id}"
+            )
+            self.mqtt_client = mqtt.Client(
+                client_id=self.client_id,
+                clean_session=True,
+                protocol=mqtt.MQTTv311
+            )
         
         self.mqtt_client.username_pw_set(
             username=config['mqtt_username'],
@@ -77,84 +186,227 @@ class ThingSpeakBridge:
         print("  MQTT TO THINGSPEAK BRIDGE")
         print("=" * 80)
         print(f"MQTT Broker:      {config['mqtt_broker']}:{config['mqtt_port']}")
-        print(f"MQTT Topic:       {config['mqtt_base_topic']}/#")
+        print(f"MQTT Topics:      {', '.join(self.subscribe_topics) or 'none'}")
+        if self.devices is not None:
+            print(f"Partition:        {config['partition']}/{config['partitions']} "
+                  f"({len(self.devices)} of {len(config['devices'])} devices)")
+        print(f"MQTT Protocol:    {'v5' if config['mqtt_v5'] else 'v3.1.1'} (client {self.client_id})")
+        if config['mqtt_v5']:
+            if self.persistent_session:
+                print(f"MQTT Session:     persistent ({config['session_expiry']}s expiry)")
+            else:
+                print("MQTT Session:     clean (set BRIDGE_INSTANCE_ID to resume sessions)")
         print(f"ThingSpeak URL:   {config['thingspeak_url']}")
         print(f"ThingSpeak Ch:    {config['thingspeak_channel_id']}")
+        self.warn_shared_channels()
+        if self.devices is None and config['mqtt_v5']:
+            print("⚠ $share mode: every group member posts its partial buffer to the same "
+                  "ThingSpeak channel, so updates are rejected by the rate limit. "
+                  "Scale ThingSpeak forwarding with BRIDGE_DEVICES partitions instead.")
         print(f"Update Interval:  {config['thingspeak_min_interval']}s")
+        print(f"Ingest Queue:     {config['ingest_queue_size']} msgs ({self.ingest_policy}), "
+              f"batch {config['ingest_batch_size']}")
         print("=" * 80)
         print()
     
+    def write_key(self, device):
+        return self.config['devices'].get(device) or self.config['thingspeak_write_key']
+
+    def warn_shared_channels(self):
+        channels = {}
+        for device in self.config['devices']:
+            channels.setdefault(self.write_key(device), []).append(device)
+        for devices in channels.values():
+            if len(devices) > 1:
+                print(f"⚠ Devices {', '.join(devices)} share one ThingSpeak channel: "
+                      f"their fields overwrite each other and the channel accepts one "
+                      f"update per {self.config['thingspeak_min_interval']}s for all of them")
+
     def signal_handler(self, sig, frame):
         print("\n\n" + "=" * 80)
         print("Stopping bridge...")
         print("=" * 80)
         self.running = False
     
-    def on_connect(self, client, userdata, flags, rc):
+    def on_connect(self, client, userdata, flags, rc, properties=None):
         if rc == 0:
             print(f"✓ Connected to MQTT broker")
             
-            topic = f"{self.config['mqtt_base_topic']}/#"
-            client.subscribe(topic, qos=1)
-            print(f"✓ Subscribed to: {topic}")
+            if not self.subscribe_topics:
+                print("⚠ No devices in this partition, nothing to subscribe to")
+                return
+
+            client.subscribe([(topic, 1) for topic in self.subscribe_topics])
+            for topic in self.subscribe_topics:
+                print(f"✓ Subscribed to: {topic}")
             print("\nWaiting for data...\n")
         else:
             print(f"✗ MQTT connection failed. Code: {rc}")
     
-    def on_disconnect(self, client, userdata, rc):
+    def on_disconnect(self, client, userdata, rc, properties=None):
         if rc != 0:
             print(f"Unexpected MQTT disconnection. Code: {rc}")
     
     def on_message(self, client, userdata, msg):
+        # Runs on paho's network thread: enqueue only, all decoding happens
+        # in the ingest worker.
+        self.stats['mqtt_received'] += 1
+        item = (msg.topic, msg.payload, time.time())
         try:
-            topic_parts = msg.topic.split('/')
-            if len(topic_parts) < 3:
+            self.ingest_queue.put_nowait(item)
+        except queue.Full:
+            self.stats['queue_overflows'] += 1
+            if self.ingest_policy == 'drop_newest':
                 return
-            
-            metric_name = topic_parts[-1]
-            
-            if metric_name in ['availability', 'status']:
-                return
-            
+            # The worker keeps only the latest value per metric, so during a
+            # burst the oldest messages are the ones worth losing.
             try:
-                payload = json.loads(msg.payload.decode())
-                value = payload.get('value')
-            except json.JSONDecodeError:
-                value = msg.payload.decode().strip()
-            
-            self.data_buffer[metric_name] = value
-            self.stats['mqtt_messages'] += 1
-            
-            timestamp = datetime.now().strftime('%H:%M:%S')
-            print(f"[{timestamp}] MQTT → {metric_name}: {value}")
-            
-            self.check_and_send_to_thingspeak()
-            
-        except Exception as e:
-            print(f"Error processing message: {e}")
-    
-    def check_and_send_to_thingspeak(self):
-        now = time.time()
-        time_since_last = now - self.last_update
+                self.ingest_queue.get_nowait()
+                self.ingest_queue.put_nowait(item)
+            except (queue.Empty, queue.Full):
+                pass
 
-        if time_since_last < self.config['thingspeak_min_interval']:
-            return
+        depth = self.ingest_queue.qsize()
+        if depth > self.stats['queue_depth_max']:
+            self.stats['queue_depth_max'] = depth
+
+    def device_of(self, topic):
+        # Readings are published as <device prefix>/<metric>
+        device = topic.rsplit('/', 1)[0]
+        if self.devices is None or device in self.config['devices']:
+            return device
+
+        self.stats['unknown_device'] += 1
+        if device not in self.unknown_devices:
+            self.unknown_devices.add(device)
+            print(f"⚠ Device {device} is not in BRIDGE_DEVICES, its readings are not forwarded")
+        return None
+
+    def decode_message(self, topic, payload):
+        topic_parts = topic.split('/')
+        if len(topic_parts) < 3:
+            return None, None, None
         
-        if not self.data_buffer:
-            return
+        metric_name = topic_parts[-1]
+        
+        if metric_name in ['availability', 'status']:
+            return None, None, None
         
-        self.send_to_thingspeak()
+        text = payload.decode()
+        sent_at = None
+        try:
+            message = json.loads(text)
+            value = message.get('value')
+            if message.get('timestamp'):
+                sent_at = datetime.fromisoformat(message['timestamp'])
+                if sent_at.tzinfo is not None:
+                    # Compare everything as naive local time
+                    sent_at = sent_at.astimezone().replace(tzinfo=None)
+        except (json.JSONDecodeError, AttributeError, ValueError):
+            value = text.strip()
+        
+        return metric_name, value, sent_at
+
+    def is_stale(self, topic, sent_at):
+        # Guards this instance against redelivered or reordered messages;
+        # it cannot see readings applied by other share-group members.
+        # Only BRIDGE_DEVICES partitioning gives per-device ordering across
+        # instances.
+        if sent_at is None:
+            return False
+
+        last = self.last_seen.get(topic)
+        if last is not None and sent_at < last:
+            self.stats['out_of_order'] += 1
+            return True
+
+        self.last_seen[topic] = sent_at
+        return False
+
+    def next_batch(self):
+        try:
+            batch = [self.ingest_queue.get(timeout=self.config['ingest_batch_wait'])]
+        except queue.Empty:
+            return []
+
+        while len(batch) < self.config['ingest_batch_size']:
+            try:
+                batch.append(self.ingest_queue.get_nowait())
+            except queue.Empty:
+                break
+
+        return batch
+
+    def process_batch(self, batch):
+        latest = {}
+        decoded = 0
+        for topic, payload, receive_time in batch:
+            device = self.device_of(topic)
+            if device is None:
+                continue
+
+            try:
+                metric_name, value, sent_at = self.decode_message(topic, payload)
+            except Exception as e:
+                print(f"Error processing message: {e}")
+                self.stats['decode_errors'] += 1
+                continue
+
+            if metric_name is None or self.is_stale(topic, sent_at):
+                continue
+
+            latest[device, metric_name] = value
+            decoded += 1
+
+        if not latest:
+            return
+
+        self.stats['mqtt_messages'] += decoded
+        self.stats['batches'] += 1
+        self.stats['coalesced'] += decoded - len(latest)
+        for (device, metric_name), value in latest.items():
+            self.data_buffer.setdefault(device, {})[metric_name] = value
+
+        timestamp = datetime.now().strftime('%H:%M:%S')
+        values = ", ".join(f"{device}/{metric}: {value}" for (device, metric), value in latest.items())
+        print(f"[{timestamp}] MQTT → {values} "
+              f"({len(batch)} msgs, queue {self.ingest_queue.qsize()})")
+
+    def ingest_worker(self):
+        while self.running or not self.ingest_queue.empty():
+            batch = self.next_batch()
+            if not batch:
+                continue
+
+            # One bad batch must not end the worker: on_message would keep
+            # filling the queue and the bridge would silently stop forwarding.
+            try:
+                self.process_batch(batch)
+                self.check_and_send_to_thingspeak()
+            except Exception as e:
+                print(f"✗ Error processing batch of {len(batch)} messages: {e}")
+                traceback.print_exc()
+                self.stats['batch_errors'] += 1
     
-    def send_to_thingspeak(self):
+    def check_and_send_to_thingspeak(self):
+        now = time.time()
+        for device in list(self.data_buffer):
+            time_since_last = now - self.last_update.get(self.write_key(device), 0)
+            if time_since_last >= self.config['thingspeak_min_interval']:
+                self.send_to_thingspeak(device)
+    
+    def send_to_thingspeak(self, device):
         try:
+            write_key = self.write_key(device)
             payload = {
-                'api_key': self.config['thingspeak_write_key']
+                'api_key': write_key
             }
             
+            buffer = self.data_buffer[device]
             field_mapping = self.config['field_mapping']
             for field_num, metric_name in field_mapping.items():
-                if metric_name and metric_name in self.data_buffer:
-                    value = self.data_buffer[metric_name]
+                if metric_name and metric_name in buffer:
+                    value = buffer[metric_name]
                     
                     if isinstance(value, str):
                         if metric_name in ['air_quality_category', 'co_status']:
@@ -167,7 +419,8 @@ class ThingSpeakBridge:
                     payload[field_num] = value
             
             if len(payload) == 1:
-                print("No numeric data to send to ThingSpeak")
+                print(f"No numeric data from {device} to send to ThingSpeak")
+                del self.data_buffer[device]
                 return
             
             print(payload)
@@ -184,7 +437,7 @@ class ThingSpeakBridge:
                 if entry_id and entry_id != '0':
                     timestamp = datetime.now().strftime('%H:%M:%S')
                     print(f"\n{'=' * 80}")
-                    print(f"[{timestamp}] ThingSpeak: Data sent successfully ✓")
+                    print(f"[{timestamp}] ThingSpeak: Data from {device} sent successfully ✓")
                     print(f"Entry ID: {entry_id}")
                     print(f"Fields sent: {len(payload) - 1}")
                     
@@ -195,10 +448,10 @@ class ThingSpeakBridge:
                     
                     print("=" * 80 + "\n")
                     
-                    self.last_update = time.time()
+                    self.last_update[write_key] = time.time()
                     self.stats['thingspeak_updates'] += 1
                     
-                    self.data_buffer.clear()
+                    del self.data_buffer[device]
                 else:
                     print(f"ThingSpeak: Update rejected (rate limit or invalid data)")
                     self.stats['thingspeak_errors'] += 1
@@ -220,11 +473,24 @@ class ThingSpeakBridge:
     
     def connect_mqtt(self):
         try:
-            self.mqtt_client.connect(
-                self.config['mqtt_broker'],
-                self.config['mqtt_port'],
-                keepalive=60
-            )
+            if self.config['mqtt_v5']:
+                properties = Properties(PacketTypes.CONNECT)
+                properties.SessionExpiryInterval = (
+                    self.config['session_expiry'] if self.persistent_session else 0
+                )
+                self.mqtt_client.connect(
+                    self.config['mqtt_broker'],
+                    self.config['mqtt_port'],
+                    keepalive=60,
+                    clean_start=not self.persistent_session,
+                    properties=properties
+                )
+            else:
+                self.mqtt_client.connect(
+                    self.config['mqtt_broker'],
+                    self.config['mqtt_port'],
+                    keepalive=60
+                )
             return True
         except Exception as e:
             print(f"✗ Failed to connect to MQTT: {e}")
@@ -236,6 +502,9 @@ class ThingSpeakBridge:
             return
         
         print("Bridge running. Press Ctrl+C to stop.\n")
+
+        self.ingest_thread = threading.Thread(target=self.ingest_worker, daemon=True)
+        self.ingest_thread.start()
         
         self.mqtt_client.loop_start()
         
@@ -251,13 +520,26 @@ class ThingSpeakBridge:
         print("\nStopping MQTT client...")
         self.mqtt_client.loop_stop()
         self.mqtt_client.disconnect()
+
+        self.running = False
+        if self.ingest_thread:
+            self.ingest_thread.join(timeout=10)
         
         runtime = time.time() - self.stats['start_time']
         print("\n" + "=" * 80)
         print("STATISTICS")
         print("=" * 80)
         print(f"Runtime:              {runtime:.0f}s ({runtime/60:.1f} min)")
+        print(f"MQTT received:        {self.stats['mqtt_received']}")
         print(f"MQTT messages:        {self.stats['mqtt_messages']}")
+        print(f"Ingest batches:       {self.stats['batches']}")
+        print(f"Coalesced messages:   {self.stats['coalesced']}")
+        print(f"Queue overflows:      {self.stats['queue_overflows']}")
+        print(f"Batch errors:         {self.stats['batch_errors']}")
+        print(f"Out-of-order dropped: {self.stats['out_of_order']}")
+        if self.devices is not None:
+            print(f"Unknown device msgs:  {self.stats['unknown_device']}")
+        print(f"Max queue depth:      {self.stats['queue_depth_max']}")
         print(f"ThingSpeak updates:   {self.stats['thingspeak_updates']}")
         print(f"ThingSpeak errors:    {self.stats['thingspeak_errors']}")
         